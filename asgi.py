@@ -0,0 +1,69 @@
+# This python file uses the following encoding: utf-8
+"""ASGI entry point: the HTTP layer runs on an event loop, requests run on two separate thread pools
+
+    uvicorn asgi:app --host 0.0.0.0 --port 6969
+
+Synthesis requests (POST /, POST /v1/audio/speech and POST /stream) run on their own executor, so catalog endpoints,
+/v1/models, health checks and static audio downloads never wait behind a running synthesis.
+Routes and responses are the same Flask app as with `python flextts.py`.
+"""
+
+import asyncio
+import os
+import threading
+
+from a2wsgi import WSGIMiddleware
+
+from flextts import app as flask_app, log, InferenceScheduler
+
+SYNTHESIS_ROUTES = {("POST", "/"), ("POST", "/v1/audio/speech"), ("POST", "/stream")}
+
+# Synthesis workers mostly wait for the inference scheduler - enough of them to fill its queue
+synthesis_workers = int(os.getenv("ASGI_SYNTHESIS_WORKERS", "0")) or InferenceScheduler.max_queue + max(1, InferenceScheduler.replica_count)
+light_workers = int(os.getenv("ASGI_LIGHT_WORKERS", "8"))
+
+
+def wsgi_app(environ, start_response):
+    """The Flask app - request bodies always end with the last ASGI message, also without Content-Length"""
+    # Lets POST /stream read a chunked body while it is still arriving
+    environ["wsgi.input_terminated"] = True
+    return flask_app(environ, start_response)
+
+
+synthesis_app = WSGIMiddleware(wsgi_app, workers=synthesis_workers)
+light_app = WSGIMiddleware(wsgi_app, workers=light_workers)
+
+log(f"ASGI mode: {synthesis_workers} synthesis workers, {light_workers} workers for everything else")
+
+
+async def watch_disconnect(scope, receive, send):
+    """Run a synthesis request while listening for the client going away
+
+    There is no socket to probe behind ASGI: the ASGI messages are read ahead instead, and http.disconnect sets the
+    event that flextts.disconnect_probe() finds in the scope. The body is handed on one message at a time.
+    """
+    disconnected = threading.Event()
+    messages = asyncio.Queue(1)
+
+    async def listen():
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            await messages.put(message)
+            if message["type"] == "http.disconnect":
+                return
+
+    listener = asyncio.ensure_future(listen())
+    try:
+        await synthesis_app({**scope, "flextts.disconnected": disconnected}, messages.get, send)
+    finally:
+        listener.cancel()
+
+
+async def app(scope, receive, send):
+    """Route each request to the executor of its kind"""
+    if scope["type"] == "http" and (scope["method"], scope["path"]) in SYNTHESIS_ROUTES:
+        await watch_disconnect(scope, receive, send)
+    else:
+        await light_app(scope, receive, send)
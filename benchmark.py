@@ -0,0 +1,512 @@
+# This python file uses the following encoding: utf-8
+"""FlexTTS load test and benchmark
+
+Runs FlexTTS in process - with a deterministic stub model by default, so no model download is needed - and
+replays a weighted mix of requests against /, /v1/audio/speech and /v1/voices at a given concurrency.
+Reports latency percentiles, requests per second, bytes out and peak RSS, and saves everything as JSON.
+
+    python benchmark.py                                   # stub model, default request mix
+    python benchmark.py --concurrency 8 --requests 500 --output after.json --compare before.json
+    python benchmark.py --backend real --rtf              # real-time factor of the real model per text length (CPU)
+    python benchmark.py --url http://localhost:6969       # load test an already running server
+"""
+
+import argparse
+import atexit
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.error
+import urllib.request
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+# ##### Stub model
+
+STUB_ENV = "FLEXTTS_BENCHMARK_STUB"  # JSON settings of the stub model - inherited by replica processes
+
+
+class StubConfig:
+    temperature = 0.75
+    length_penalty = 1.0
+    repetition_penalty = 10.0
+    top_k = 50
+    top_p = 0.85
+    gpt_cond_len = 6
+    gpt_cond_chunk_len = 6
+    max_ref_len = 10
+    sound_norm_refs = False
+
+
+class StubXtts:
+    """Deterministic stand-in for the XTTS model: fixed latency and waveform length per character"""
+    config = StubConfig()
+
+    def __init__(self, settings: dict):
+        import torch
+        self.settings = settings
+        self.device = torch.device("cpu")
+
+    def get_conditioning_latents(self, audio_path, **kwargs):
+        import torch
+        time.sleep(self.settings["conditioning_ms"] / 1000)
+        return torch.ones(1, 32, 1024), torch.ones(1, 512, 1)
+
+    def inference(self, text, language, gpt_cond_latent, speaker_embedding, **kwargs):
+        time.sleep((self.settings["latency_ms"] + self.settings["ms_per_char"] * len(text)) / 1000)
+        samples = int(self.settings["audio_per_char"] * len(text) * 24000)
+        # Same text, same waveform
+        frequency = 120 + sum(text.encode("utf-8")) % 200
+        return {"wav": (0.3 * np.sin(np.arange(samples) * (2 * np.pi * frequency / 24000))).astype(np.float32)}
+
+
+class StubSynthesizer:
+    output_sample_rate = 24000
+
+    def __init__(self, settings: dict):
+        self.tts_model = StubXtts(settings)
+
+
+class StubTTS:
+    """Replaces TTS.api.TTS, so TTSManager loads the stub instead of downloading XTTS"""
+
+    def __init__(self, model_name=None, gpu=False, **kwargs):
+        settings = json.loads(os.environ[STUB_ENV])
+        time.sleep(settings["load_ms"] / 1000)
+        self.model_name = model_name
+        self.synthesizer = StubSynthesizer(settings)
+
+    def tts(self, text, speaker_wav=None, language=None, **kwargs):
+        """Used for models other than XTTS (e.g. the tts-1 tier)"""
+        return self.synthesizer.tts_model.inference(text, language, None, None)["wav"]
+
+
+def install_stub():
+    """Make `from TTS.api import TTS` return the stub - must run before flextts is imported"""
+    package = types.ModuleType("TTS")
+    api = types.ModuleType("TTS.api")
+    api.TTS = StubTTS
+    package.api = api
+    sys.modules["TTS"] = package
+    sys.modules["TTS.api"] = api
+
+
+# Replica processes re-import this module before flextts, so they get the stub as well
+if os.getenv(STUB_ENV):
+    install_stub()
+
+
+# ##### Request mix
+
+TEXTS = {
+    "short": [
+        "The washing machine is done.",
+        "Someone is at the front door.",
+        "The garage door is open.",
+        "Good morning! It is seven o'clock."
+    ],
+    "medium": [
+        "Good morning. Today will be mostly sunny with a high of twenty-one degrees. There is a light breeze from the west.",
+        "Reminder: the recycling bin goes out tonight. Tomorrow morning you have a dentist appointment at nine thirty."
+    ],
+    "long": [
+        "Here is your daily briefing. The weather today will start cloudy, with the sun coming through around noon and "
+        "temperatures reaching twenty-three degrees in the afternoon. In the evening there is a chance of thunderstorms, "
+        "so you might want to close the windows before you leave. Your calendar has three appointments: a team meeting "
+        "at ten, lunch with Anna at half past twelve and a call with the landlord at four. The dishwasher finished its "
+        "cycle an hour ago, and the living room lights are still on. Traffic on your way to work is light, with an "
+        "expected travel time of twenty-two minutes."
+    ]
+}
+
+TEXT_WEIGHTS = {"short": 6, "medium": 3, "long": 1}
+
+DEFAULT_MIX = [
+    {"name": "native_url", "weight": 3, "method": "POST", "path": "/", "text_field": "text", "body": {"response_type": "url"}},
+    {"name": "native_base64", "weight": 1, "method": "POST", "path": "/", "text_field": "text", "body": {"response_type": "base64"}},
+    {"name": "native_file", "weight": 1, "method": "POST", "path": "/", "text_field": "text", "body": {"response_type": "file"}},
+    {"name": "openai_speech", "weight": 3, "method": "POST", "path": "/v1/audio/speech", "text_field": "input", "body": {"model": "tts-1", "voice": "alloy", "response_format": "wav"}},
+    {"name": "openai_stream", "weight": 1, "method": "POST", "path": "/v1/audio/speech", "text_field": "input", "body": {"model": "tts-1-hd", "voice": "alloy", "response_format": "wav", "stream": True}},
+    {"name": "voices", "weight": 2, "method": "GET", "path": "/v1/voices"}
+]
+
+
+def build_requests(mix: list, count: int, repeat_ratio: float, seed: int) -> list:
+    """Draw `count` requests from the mix - repeat_ratio of the texts are announcements heard before (cache hits)"""
+    rng = random.Random(seed)
+    requests = []
+    for index in range(count):
+        entry = rng.choices(mix, weights=[item["weight"] for item in mix])[0]
+        body = dict(entry.get("body", {}))
+        if "text_field" in entry:
+            length = rng.choices(list(TEXT_WEIGHTS), weights=list(TEXT_WEIGHTS.values()))[0]
+            text = rng.choice(TEXTS[length])
+            if rng.random() >= repeat_ratio:
+                text += f" Message number {index}."
+            body[entry["text_field"]] = text
+        requests.append((entry["name"], entry["method"], entry["path"], body if entry["method"] == "POST" else None))
+    return requests
+
+
+# ##### Load test
+
+def send_request(base_url: str, method: str, path: str, body: dict, timeout: float) -> dict:
+    """One request, body fully read - returns status, latency, time to first byte and bytes received"""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    http_request = urllib.request.Request(base_url + path, data=data, method=method, headers={"Content-Type": "application/json", "Accept": "application/json"})
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            status = response.status
+            while True:
+                chunk = response.read1(65536) if hasattr(response, "read1") else response.read(65536)
+                if first_byte is None:
+                    first_byte = time.perf_counter()
+                if not chunk:
+                    break
+                size += len(chunk)
+    except urllib.error.HTTPError as e:
+        status = e.code
+        size = len(e.read())
+    except Exception:
+        status = 0
+    finished = time.perf_counter()
+    return {"status": status, "latency": finished - started, "ttfb": (first_byte or finished) - started, "bytes": size}
+
+
+def wait_ready(base_url: str, timeout: float) -> float:
+    """Poll /readyz until the model is loaded and warmed up - returns the seconds waited"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if send_request(base_url, "GET", "/readyz", None, timeout)["status"] == 200:
+            return time.perf_counter() - started
+        time.sleep(0.2)
+    raise TimeoutError(f"Server at {base_url} was not ready within {timeout:.0f}s")
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    milliseconds = np.array(values) * 1000
+    return {
+        "p50": round(float(np.percentile(milliseconds, 50)), 2),
+        "p95": round(float(np.percentile(milliseconds, 95)), 2),
+        "p99": round(float(np.percentile(milliseconds, 99)), 2),
+        "mean": round(float(milliseconds.mean()), 2),
+        "max": round(float(milliseconds.max()), 2)
+    }
+
+
+def summarize(results: list, duration: float) -> dict:
+    ok = [result for result in results if 200 <= result["status"] < 400]
+    statuses = {}
+    for result in results:
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "statuses": statuses,
+        "requests_per_second": round(len(results) / duration, 2) if duration > 0 else None,
+        "bytes_out": sum(result["bytes"] for result in results),
+        "latency_ms": percentiles([result["latency"] for result in ok]),
+        "ttfb_ms": percentiles([result["ttfb"] for result in ok])
+    }
+
+
+def run_load(base_url: str, requests: list, concurrency: int, timeout: float) -> dict:
+    """Replay the requests with `concurrency` clients and summarize overall and per request type"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        results = list(clients.map(lambda item: dict(send_request(base_url, *item[1:], timeout), name=item[0]), requests))
+    duration = time.perf_counter() - started
+
+    by_request = {}
+    for result in results:
+        by_request.setdefault(result["name"], []).append(result)
+    return {
+        "duration_seconds": round(duration, 3),
+        "summary": summarize(results, duration),
+        "by_request": {name: summarize(items, duration) for name, items in sorted(by_request.items())}
+    }
+
+
+# ##### Real-time factor
+
+def run_rtf(flextts, runs: int, samples_dir: str = None) -> list:
+    """Seconds of audio per second of wall time for each text length, measured without the audio cache"""
+    flextts.AudioCache.enabled = False
+    language = flextts.default["language"]
+    speaker_wav = os.path.join(flextts.speaker_path, language, flextts.default["speaker"] + ".wav")
+    # Warm up: speaker latents, first inference
+    flextts.synthesize(TEXTS["short"][0], language, speaker_wav)
+
+    results = []
+    for length, texts in TEXTS.items():
+        text = texts[0]
+        audio_seconds = []
+        wall_seconds = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            wav = flextts.synthesize(text, language, speaker_wav)
+            wall_seconds.append(time.perf_counter() - started)
+            audio_seconds.append(len(wav) / flextts.TTSManager.sample_rate)
+        if samples_dir:
+            # Last run of each length, for listening and spectral comparison
+            os.makedirs(samples_dir, exist_ok=True)
+            with open(os.path.join(samples_dir, length + ".wav"), "wb") as sample_file:
+                sample_file.write(flextts.wav_bytes(wav, flextts.TTSManager.sample_rate))
+        result = {
+            "length": length,
+            "characters": len(text),
+            "audio_seconds": round(float(np.mean(audio_seconds)), 3),
+            "wall_seconds": round(float(np.mean(wall_seconds)), 3),
+            "rtf": round(float(np.sum(audio_seconds) / np.sum(wall_seconds)), 3)
+        }
+        print(f"  {length:<6} {result['characters']:>4} chars  {result['audio_seconds']:>7.2f}s audio  {result['wall_seconds']:>7.2f}s wall  RTF {result['rtf']:.2f}")
+        results.append(result)
+    flextts.AudioCache.enabled = True
+    return results
+
+
+# ##### CPU precision comparison
+
+def average_spectrum_db(path: str) -> np.ndarray:
+    """Long-term average power spectrum of a WAV file in dB"""
+    with wave.open(path, "rb") as wav_file:
+        samples = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype="<i2").astype(np.float32) / 32768
+    window = np.hanning(1024)
+    frames = np.array([samples[start:start + 1024] * window for start in range(0, max(1, len(samples) - 1024), 512)])
+    power = np.mean(np.abs(np.fft.rfft(frames, n=1024, axis=1)) ** 2, axis=0)
+    return 10 * np.log10(power + 1e-10)
+
+
+def compare_precisions(args) -> dict:
+    """Run the RTF benchmark once per CPU_PRECISION in a fresh process and compare speed and sound with the first mode"""
+    modes = [mode.strip() for mode in args.compare_precision.split(",") if mode.strip()]
+    samples_root = args.samples_dir or "benchmark_samples"
+    forwarded = ["--backend", args.backend, "--requests", "0", "--rtf", "--rtf-runs", str(args.rtf_runs), "--timeout", str(args.timeout)]
+    forwarded += [f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items() if name.startswith("stub_")]
+    forwarded += ["--gpu"] if args.gpu else []
+
+    runs = {}
+    for mode in modes:
+        print(f"\n##### CPU_PRECISION={mode}")
+        output = os.path.join(samples_root, mode + ".json")
+        os.makedirs(samples_root, exist_ok=True)
+        command = [sys.executable, os.path.abspath(__file__), *forwarded, "--samples-dir", os.path.join(samples_root, mode), "--output", output]
+        subprocess.run(command, env={**os.environ, "CPU_PRECISION": mode}, check=True)
+        with open(output) as run_file:
+            runs[mode] = json.load(run_file)
+
+    reference = modes[0]
+    comparison = {}
+    for mode in modes:
+        entries = []
+        for result in runs[mode]["rtf"]:
+            entry = dict(result)
+            # Sampling is random, so waveforms differ in any case - compare the average spectrum (timbre, noise) instead
+            entry["spectral_difference_db"] = round(float(np.mean(np.abs(
+                average_spectrum_db(os.path.join(samples_root, mode, result["length"] + ".wav")) -
+                average_spectrum_db(os.path.join(samples_root, reference, result["length"] + ".wav"))
+            ))), 2)
+            entries.append(entry)
+        comparison[mode] = {"ready_seconds": runs[mode]["ready_seconds"], "peak_rss_mb": runs[mode]["peak_rss_mb"], "model": runs[mode].get("model"), "rtf": entries}
+
+    print(f"\nCPU precision comparison (RTF = audio seconds per wall second, spectral difference against {reference}):")
+    for mode, result in comparison.items():
+        text = f"  {mode:<6} ready {result['ready_seconds']:>7.1f}s  RSS {result['peak_rss_mb'].get('server', 0):>7.0f} MB"
+        text += "".join(f"  {entry['length']} RTF {entry['rtf']:>5.2f} ({entry['spectral_difference_db']:.1f} dB)" for entry in result["rtf"])
+        print(text)
+    print(f"Samples for listening: {os.path.abspath(samples_root)}")
+    return {"reference": reference, "precisions": comparison}
+
+
+# ##### Setup and reporting
+
+def write_speaker(path: str):
+    """Two seconds of noise as the reference voice of the stub model"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    samples = (np.random.RandomState(0).uniform(-0.1, 0.1, 48000) * 32767).astype("<i2")
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(24000)
+        wav_file.writeframes(samples.tobytes())
+
+
+def start_server(args):
+    """Import FlexTTS with the selected backend and serve it on a free local port"""
+    if args.backend == "stub":
+        os.environ[STUB_ENV] = json.dumps({
+            "load_ms": args.stub_load_ms,
+            "conditioning_ms": args.stub_conditioning_ms,
+            "latency_ms": args.stub_latency_ms,
+            "ms_per_char": args.stub_ms_per_char,
+            "audio_per_char": args.stub_audio_per_char
+        })
+        install_stub()
+        if not os.getenv("APP_PATH"):
+            # Throwaway data directory with one speaker, so benchmarks never touch real caches
+            app_path = tempfile.mkdtemp(prefix="flextts-benchmark-")
+            atexit.register(shutil.rmtree, app_path, True)
+            write_speaker(os.path.join(app_path, "data", "speakers", "en", "benchmark.wav"))
+            os.environ.update({"APP_PATH": app_path, "DEFAULT_LANGUAGE": "en", "DEFAULT_SPEAKER": "benchmark"})
+    elif not args.gpu:
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    if args.no_cache:
+        os.environ["AUDIO_CACHE"] = "false"
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import flextts
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, flextts.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="benchmark-server", daemon=True).start()
+    return flextts, server
+
+
+def peak_rss_mb(flextts=None) -> dict:
+    """Peak resident memory of this process and of the replica processes (Linux)"""
+    peak = {"server": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    for replica in getattr(flextts.InferenceScheduler, "_replicas", []) if flextts else []:
+        try:
+            with open(f"/proc/{replica.process.pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        peak[f"replica_{replica.index}"] = round(int(line.split()[1]) / 1024, 1)
+        except (OSError, AttributeError):
+            pass
+    return peak
+
+
+def git_version() -> str:
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: dict, baseline: dict = None):
+    def line(name, summary, base=None):
+        latency = summary["latency_ms"] or {}
+        text = f"  {name:<16} {summary['requests']:>6} req  {summary['errors']:>4} err  {summary['requests_per_second'] or 0:>8.2f} req/s"
+        text += "".join(f"  {key} {latency.get(key, 0):>8.1f}ms" for key in ("p50", "p95", "p99"))
+        if base:
+            base_latency = base["latency_ms"] or {}
+            text += "  |" + "".join(f" {key} {change(latency.get(key), base_latency.get(key))}" for key in ("p50", "p95", "p99"))
+            text += f" req/s {change(summary['requests_per_second'], base['requests_per_second'])}"
+        print(text)
+
+    def change(value, base_value):
+        if not value or not base_value:
+            return "n/a"
+        return f"{(value - base_value) / base_value * 100:+.1f}%"
+
+    load = report["load"]
+    base_load = (baseline or {}).get("load") or {}
+    print(f"\nLoad test: {load['summary']['requests']} requests in {load['duration_seconds']:.2f}s, {load['summary']['bytes_out'] / 1024 / 1024:.1f} MB out" + (f" (compared to {baseline.get('version')})" if baseline else ""))
+    line("all", load["summary"], base_load.get("summary"))
+    for name, summary in load["by_request"].items():
+        line(name, summary, base_load.get("by_request", {}).get(name))
+    print("Peak RSS: " + ", ".join(f"{name} {value} MB" for name, value in report["peak_rss_mb"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FlexTTS load test and benchmark")
+    parser.add_argument("--backend", choices=["stub", "real"], default="stub", help="Model used in process (default: stub)")
+    parser.add_argument("--url", help="Load test an already running server instead of starting one")
+    parser.add_argument("--requests", type=int, default=None, help="Number of requests (default: 200, 0 with --backend real)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel clients (default: 4)")
+    parser.add_argument("--repeat-ratio", type=float, default=0.5, help="Share of texts that were requested before (default: 0.5)")
+    parser.add_argument("--mix", help="JSON file with the request mix (list of name, weight, method, path, text_field, body)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the request sequence (default: 1)")
+    parser.add_argument("--timeout", type=float, default=300, help="Request timeout in seconds (default: 300)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the audio cache of the in-process server")
+    parser.add_argument("--rtf", action="store_true", help="Measure the real-time factor per text length (default with --backend real)")
+    parser.add_argument("--rtf-runs", type=int, default=3, help="Runs per text length for --rtf (default: 3)")
+    parser.add_argument("--samples-dir", help="Save the synthesized audio of --rtf as WAV files in this directory")
+    parser.add_argument("--compare-precision", help="Compare CPU_PRECISION modes, e.g. fp32,int8,bf16 (first one is the reference)")
+    parser.add_argument("--gpu", action="store_true", help="Allow CUDA for --backend real (default: CPU only)")
+    parser.add_argument("--stub-load-ms", type=float, default=0, help="Stub model load time (default: 0)")
+    parser.add_argument("--stub-conditioning-ms", type=float, default=50, help="Stub speaker conditioning time (default: 50)")
+    parser.add_argument("--stub-latency-ms", type=float, default=20, help="Stub fixed inference time per sentence (default: 20)")
+    parser.add_argument("--stub-ms-per-char", type=float, default=1.0, help="Stub inference time per character (default: 1.0)")
+    parser.add_argument("--stub-audio-per-char", type=float, default=0.06, help="Stub seconds of audio per character (default: 0.06)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    if args.compare_precision:
+        report = {"version": git_version(), "timestamp": datetime.now().isoformat(timespec="seconds"), **compare_precisions(args)}
+        if args.output:
+            with open(args.output, "w") as output_file:
+                json.dump(report, output_file, indent=2)
+        return
+
+    if args.requests is None:
+        args.requests = 0 if args.backend == "real" and not args.url else 200
+    mix = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix) as mix_file:
+            mix = json.load(mix_file)
+
+    flextts = None
+    base_url = args.url.rstrip("/") if args.url else None
+    if base_url is None:
+        flextts, server = start_server(args)
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+    report = {
+        "version": git_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    }
+
+    report["ready_seconds"] = round(wait_ready(base_url, args.timeout), 3)
+    print(f"Server ready after {report['ready_seconds']:.2f}s")
+
+    if args.requests > 0:
+        requests = build_requests(mix, args.requests, args.repeat_ratio, args.seed)
+        # One request per type first, so model loading and speaker conditioning are not measured
+        for name, method, path, body in {name: (name, method, path, body) for name, method, path, body in requests}.values():
+            send_request(base_url, method, path, body, args.timeout)
+        report["load"] = run_load(base_url, requests, args.concurrency, args.timeout)
+
+    if (args.rtf or args.backend == "real") and flextts is not None:
+        print(f"\nReal-time factor ({args.backend} model, audio seconds per wall second):")
+        report["rtf"] = run_rtf(flextts, args.rtf_runs, args.samples_dir)
+
+    report["peak_rss_mb"] = peak_rss_mb(flextts) if flextts is not None else {}
+    if flextts is not None:
+        report["model"] = {**flextts.ModelLoader.get_stats(), "cpu_precision": flextts.TTSManager.cpu_precision, "bf16_autocast": flextts.TTSManager.autocast_bf16}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+    if "load" in report:
+        print_report(report, baseline)
+    elif report["peak_rss_mb"]:
+        print("Peak RSS: " + ", ".join(f"{name} {value} MB" for name, value in report["peak_rss_mb"].items()))
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,10 @@
 
 import warnings
 import logging
+import multiprocessing
 import os
 import sys
-from io import StringIO
+from io import BytesIO, StringIO
 
 # Check if environment variables are set
 if os.getenv("DEFAULT_LANGUAGE") is None:
@@ -32,138 +33,2925 @@ if not DEBUG:
     logging.getLogger('TTS').setLevel(logging.ERROR)  # TTS library logging
 
 import base64
+import codecs
+import cProfile
+import hashlib
+import heapq
+import hmac
+import importlib.metadata
+import json
+import math
+import platform
+import pstats
+import random
 import re
+import select
+import shutil
+import socket
+import struct
+import subprocess
+import threading
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Union
 
-from flask import Flask, request, render_template, jsonify, url_for, send_file
+from flask import Flask, Response, g, request, render_template, jsonify, url_for, send_file
 
+import numpy as np
+import pysbd
 import torch
 from TTS.api import TTS
 
+try:
+    import torchaudio.functional as torchaudio_functional  # Resampling and time stretching
+except ImportError:
+    torchaudio_functional = None
+
 if not DEBUG:
     torch.set_warn_always(False)  # Disable PyTorch warnings
 
-# ##### Basics
+# ##### Basics
+
+def log(*args):
+    if args:
+        print(" > [" + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "] " + " ".join(str(arg) for arg in args))
+
+class QuietStdout:
+    """sys.stdout wrapper that drops prints of threads inside silence_stdout() - other threads keep logging"""
+    _local = threading.local()
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        if getattr(self._local, "depth", 0) > 0:
+            return len(text)
+        return self._stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+@contextmanager
+def silence_stdout():
+    """Silence the TTS library's prints in the current thread (no-op in debug mode)"""
+    QuietStdout._local.depth = getattr(QuietStdout._local, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        QuietStdout._local.depth -= 1
+
+
+if not DEBUG:
+    sys.stdout = QuietStdout(sys.stdout)
+
+log("Loading FlexTTS")
+
+app_path = os.getenv("APP_PATH", os.getcwd())  # Use APP_PATH if set, otherwise getcwd
+speaker_path = os.path.join(app_path, "data", "speakers")
+latent_path = os.path.join(app_path, "data", "latents")
+quantized_path = os.path.join(app_path, "data", "quantized")
+static_audio_path = os.path.join(app_path, "static", "audio")
+jobs_path = os.path.join(app_path, "data", "jobs")
+profiles_path = os.path.join(app_path, "data", "profiles")
+
+if not os.path.exists(speaker_path):
+    os.makedirs(speaker_path)
+
+if not os.path.exists(latent_path):
+    os.makedirs(latent_path)
+
+if not os.path.exists(static_audio_path):
+    os.makedirs(static_audio_path)
+
+# Check if DEFAULT_LANGUAGE and DEFAULT_SPEAKER are set and valid
+
+default = {
+    "language": os.getenv("DEFAULT_LANGUAGE"),
+    "speaker": os.getenv("DEFAULT_SPEAKER").lower().replace(" ", "_")
+}
+
+if not default["language"] or not default["speaker"]:
+    raise ValueError("Fatal Error: DEFAULT_LANGUAGE and DEFAULT_SPEAKER environment variables must be set")
+
+if not os.path.exists(os.path.join(speaker_path, default["language"])):
+    raise ValueError("Fatal Error: DEFAULT_LANGUAGE has no speaker files")
+    
+if not os.path.exists(os.path.join(speaker_path, default["language"], default["speaker"] + ".wav")):
+    raise ValueError("Fatal Error: DEFAULT_SPEAKER does not exist", os.path.join(speaker_path, default["language"], default["speaker"] + ".wav"))
+
+
+# ##### Metrics
+
+class Metrics:
+    """Prometheus counters, gauges and histograms kept in process - rendered in the text format on /metrics"""
+    latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    definitions = {
+        # name -> (type, help, histogram buckets)
+        "flextts_requests_total": ("counter", "HTTP requests by endpoint and status", None),
+        "flextts_request_duration_seconds": ("histogram", "Time until the response is ready (first byte for streams)", latency_buckets),
+        "flextts_stage_duration_seconds": ("histogram", "Time spent per processing stage", latency_buckets),
+        "flextts_real_time_factor": ("histogram", "Seconds of audio synthesized per second of wall time", (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)),
+        "flextts_characters_per_second": ("histogram", "Input characters synthesized per second of wall time", (5, 10, 25, 50, 100, 250, 500, 1000)),
+        "flextts_characters_total": ("counter", "Input characters synthesized", None),
+        "flextts_audio_seconds_total": ("counter", "Seconds of audio synthesized", None),
+        "flextts_model_load_seconds": ("gauge", "Time it took to load the TTS model", None),
+        "flextts_dropped_sentences_total": ("counter", "Queued sentences dropped before inference, by reason (expired, cancelled)", None),
+        "flextts_wasted_inference_seconds_total": ("counter", "Inference time spent on sentences no client received, by reason (abandoned, discarded)", None)
+    }
+    _values = {}  # name -> {label items: value}, histograms as [bucket counts..., sum, count]
+    _lock = threading.Lock()
+    _local = threading.local()
+
+    @classmethod
+    def bind(cls, **labels):
+        """Set labels (endpoint, language, speaker) for metrics recorded by the current thread"""
+        cls._local.labels = {**cls.labels(), **labels}
+
+    @classmethod
+    def reset(cls, **labels):
+        cls._local.labels = labels
+
+    @classmethod
+    def labels(cls) -> dict:
+        return getattr(cls._local, "labels", {})
+
+    @classmethod
+    def inc(cls, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with cls._lock:
+            series = cls._values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    @classmethod
+    def set(cls, name: str, value: float, **labels):
+        with cls._lock:
+            cls._values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    @classmethod
+    def observe(cls, name: str, value: float, **labels):
+        buckets = cls.definitions[name][2]
+        key = tuple(sorted(labels.items()))
+        with cls._lock:
+            series = cls._values.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * len(buckets) + [0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @classmethod
+    @contextmanager
+    def stage(cls, name: str, labels: Optional[dict] = None):
+        """Time a block as one processing stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe("flextts_stage_duration_seconds", time.perf_counter() - started, stage=name, **(cls.labels() if labels is None else labels))
+
+    @classmethod
+    def record_synthesis(cls, characters: int, audio_seconds: float, wall_seconds: float, labels: Optional[dict] = None):
+        """Throughput of one synthesized text"""
+        labels = cls.labels() if labels is None else labels
+        cls.inc("flextts_characters_total", characters, **labels)
+        cls.inc("flextts_audio_seconds_total", audio_seconds, **labels)
+        if wall_seconds > 0:
+            cls.observe("flextts_real_time_factor", audio_seconds / wall_seconds, **labels)
+            cls.observe("flextts_characters_per_second", characters / wall_seconds, **labels)
+
+    @staticmethod
+    def _format_labels(labels, extra=()) -> str:
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+    @classmethod
+    def render(cls, gauges: Optional[Dict[str, dict]] = None) -> str:
+        """Text exposition of all metrics - plus the numeric values of the given stats dicts as gauges"""
+        lines = []
+        with cls._lock:
+            for name, (kind, description, buckets) in cls.definitions.items():
+                series = cls._values.get(name)
+                if not series:
+                    continue
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+                for labels, value in sorted(series.items()):
+                    if kind != "histogram":
+                        lines.append(f"{name}{cls._format_labels(labels)} {value}")
+                        continue
+                    for bound, count in zip(buckets, value):
+                        lines.append(f"{name}_bucket{cls._format_labels(labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{cls._format_labels(labels, [('le', '+Inf')])} {value[-1]}")
+                    lines.append(f"{name}_sum{cls._format_labels(labels)} {value[-2]}")
+                    lines.append(f"{name}_count{cls._format_labels(labels)} {value[-1]}")
+
+        def flatten(prefix, stats):
+            for key, value in stats.items():
+                name = re.sub(r'[^a-zA-Z0-9_]', '_', f"{prefix}_{key}")
+                if isinstance(value, dict):
+                    yield from flatten(name, value)
+                elif isinstance(value, (int, float)):
+                    yield name, float(value)
+
+        # A family may only be declared once, or Prometheus rejects the whole scrape - defined metrics win
+        seen = set(cls.definitions)
+        for component, stats in (gauges or {}).items():
+            for name, value in flatten("flextts_" + component, stats):
+                if name in seen:
+                    continue
+                seen.add(name)
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+# ##### Profiling
+
+class Profiler:
+    """Operator-selected requests run under cProfile, their sentences under the PyTorch profiler as well
+
+    Disabled unless PROFILE_TOKEN is set. A request is profiled if it sends the token in an X-Profile header, or if it
+    is picked by the sampling an operator switched on with POST /admin/profiling. Each profile is a directory in
+    data/profiles with pstats files, Chrome traces (open in chrome://tracing or Perfetto) and text summaries.
+    """
+    token = os.getenv("PROFILE_TOKEN") or None
+    max_count = int(os.getenv("PROFILE_MAX_COUNT", "20"))
+    max_size = int(float(os.getenv("PROFILE_MAX_MB", "500")) * 1024 * 1024)
+    top_rows = int(os.getenv("PROFILE_TOP_ROWS", "25"))
+    sample_rate = 0.0
+    sample_until = None  # _clock() when sampling switches itself off again
+    stats = {"requests": 0, "sentences": 0, "sampled": 0, "pruned": 0, "failed": 0}
+    _clock = time.time  # The sampling's own clock and dice, replaceable in tests
+    _random = random.random
+    _sentences = {}  # profile directory -> number of sentences profiled so far
+    _lock = threading.Lock()
+    _local = threading.local()
+
+    @classmethod
+    def authorized(cls, value: Optional[str]) -> bool:
+        """True if the value is the profiling token"""
+        return cls.token is not None and value is not None and hmac.compare_digest(value.encode(), cls.token.encode())
+
+    @classmethod
+    def set_sampling(cls, rate: float, seconds: float):
+        """Profile a random share of the synthesis requests for the given time"""
+        with cls._lock:
+            cls.sample_rate = rate
+            cls.sample_until = cls._clock() + seconds if rate > 0 else None
+
+    @classmethod
+    def select(cls, header: Optional[str]) -> Optional[str]:
+        """Why the current request should be profiled ("header" or "sampled"), None for most requests"""
+        if cls.authorized(header):
+            return "header"
+        if cls.sample_rate > 0:
+            # Read both together - set_sampling on another thread may switch sampling off in between
+            with cls._lock:
+                rate, until = cls.sample_rate, cls.sample_until
+                if rate > 0 and cls._clock() > until:
+                    cls.sample_rate, cls.sample_until = 0.0, None
+                    log("Profiling: sampling ended")
+                    rate = 0.0
+            if cls._random() < rate:
+                return "sampled"
+        return None
+
+    @classmethod
+    def bind(cls, profile: Optional[str]):
+        """Set the profile directory for sentences queued by the current thread"""
+        cls._local.profile = profile
+
+    @classmethod
+    def current(cls) -> Optional[str]:
+        return getattr(cls._local, "profile", None)
+
+    @classmethod
+    def begin(cls, trigger: str) -> tuple:
+        """Create a profile directory and start profiling the request thread"""
+        profile = os.path.join(profiles_path, datetime.now().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6])
+        os.makedirs(profile)
+        cls.prune()
+        with cls._lock:
+            cls.stats["requests"] += 1
+            cls.stats["sampled"] += trigger == "sampled"
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Python 3.12+ allows a single cProfile at a time - the sentences are still traced
+            log("Profiling: request thread not profiled:", str(e))
+            profiler = None
+        return profile, profiler
+
+    @classmethod
+    def finish(cls, profile: str, profiler: Optional[cProfile.Profile], description: str):
+        """Stop profiling the request thread and write request.pstats and summary.txt"""
+        if profiler is not None:
+            profiler.disable()
+        try:
+            summary = [description, ""]
+            if profiler is not None:
+                profiler.dump_stats(os.path.join(profile, "request.pstats"))
+                summary += ["Top functions of the request thread", cls._top_functions(profiler)]
+            with open(os.path.join(profile, "summary.txt"), "w") as file:
+                file.write("\n".join(summary))
+        except Exception as e:
+            cls._failed(e)
+
+    @classmethod
+    def sentence_prefix(cls, profile: str) -> str:
+        """File name prefix for the next profiled sentence of a request"""
+        with cls._lock:
+            index = cls._sentences.get(profile, 0) + 1
+            cls._sentences[profile] = index
+            cls.stats["sentences"] += 1
+        return os.path.join(profile, f"sentence-{index:03d}")
+
+    @classmethod
+    @contextmanager
+    def inference(cls, prefix: Optional[str]):
+        """Run the block under the PyTorch profiler and cProfile if a prefix is given - <prefix>.trace.json, .pstats and .txt"""
+        if prefix is None:
+            yield
+            return
+        cuda = torch.cuda.is_available()
+        activities = [torch.profiler.ProfilerActivity.CPU] + ([torch.profiler.ProfilerActivity.CUDA] if cuda else [])
+        profiler = cProfile.Profile()
+        with torch.profiler.profile(activities=activities, record_shapes=True) as trace:
+            try:
+                profiler.enable()
+            except ValueError:
+                profiler = None
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        try:
+            trace.export_chrome_trace(prefix + ".trace.json")
+            summary = ["Top operators", trace.key_averages().table(sort_by="self_cuda_time_total" if cuda else "self_cpu_time_total", row_limit=cls.top_rows)]
+            if profiler is not None:
+                profiler.dump_stats(prefix + ".pstats")
+                summary += ["Top functions", cls._top_functions(profiler)]
+            with open(prefix + ".txt", "w") as file:
+                file.write("\n".join(summary))
+        except Exception as e:
+            cls._failed(e)
+
+    @classmethod
+    def _top_functions(cls, profiler: cProfile.Profile) -> str:
+        output = StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(cls.top_rows)
+        return output.getvalue()
+
+    @classmethod
+    def _failed(cls, error: Exception):
+        with cls._lock:
+            cls.stats["failed"] += 1
+        log("Profiling: writing the profile failed:", str(error))
+
+    @classmethod
+    def list_profiles(cls) -> List[dict]:
+        """Profiles on disk, newest first"""
+        profiles = []
+        if not os.path.isdir(profiles_path):
+            return profiles
+        for name in sorted(os.listdir(profiles_path), reverse=True):
+            directory = os.path.join(profiles_path, name)
+            if not os.path.isdir(directory):
+                continue
+            files = sorted(os.listdir(directory))
+            profiles.append({
+                "id": name,
+                "created": datetime.fromtimestamp(os.path.getctime(directory)).isoformat(timespec="seconds"),
+                "files": files,
+                "size_bytes": sum(os.path.getsize(os.path.join(directory, file)) for file in files)
+            })
+        return profiles
+
+    @classmethod
+    def profile_path(cls, profile_id: str, filename: Optional[str] = None) -> Optional[str]:
+        """Path of a profile directory or one of its files, None if it does not exist"""
+        parts = [profile_id] + ([filename] if filename else [])
+        if any(part != os.path.basename(part) or part.startswith(".") for part in parts):
+            return None
+        path = os.path.join(profiles_path, *parts)
+        return path if os.path.exists(path) else None
+
+    @classmethod
+    def summary(cls, profile_id: str) -> Optional[str]:
+        """All text summaries of a profile - the request first, then its sentences"""
+        directory = cls.profile_path(profile_id)
+        if directory is None:
+            return None
+        files = sorted(name for name in os.listdir(directory) if name.endswith(".txt"))
+        files.sort(key=lambda name: name != "summary.txt")
+        parts = []
+        for name in files:
+            with open(os.path.join(directory, name)) as file:
+                parts.append(f"===== {name}\n{file.read()}")
+        return "\n\n".join(parts)
+
+    @classmethod
+    def prune(cls):
+        """Delete the oldest profiles beyond PROFILE_MAX_COUNT and PROFILE_MAX_MB"""
+        profiles = cls.list_profiles()
+        total = sum(profile["size_bytes"] for profile in profiles)
+        for index, profile in reversed(list(enumerate(profiles))):
+            if index < cls.max_count and total <= cls.max_size:
+                break
+            shutil.rmtree(os.path.join(profiles_path, profile["id"]), ignore_errors=True)
+            total -= profile["size_bytes"]
+            with cls._lock:
+                cls._sentences.pop(os.path.join(profiles_path, profile["id"]), None)
+                cls.stats["pruned"] += 1
+
+    @classmethod
+    def get_stats(cls):
+        with cls._lock:
+            return {
+                "enabled": cls.token is not None,
+                "sample_rate": cls.sample_rate,
+                "sampling_until": datetime.fromtimestamp(cls.sample_until).isoformat(timespec="seconds") if cls.sample_until else None,
+                **cls.stats
+            }
+
+
+# Initialize TTS model
+os.environ['TTS_HOME'] = os.path.join(app_path, "data") # Save to permanent storage (for Docker)
+os.environ['COQUI_TOS_AGREED'] = "1" # Required for uninterrupted TTS Model Download
+
+# OpenAI model id -> Coqui model. Models other than XTTS are run through TTS.tts(): "languages" maps our language
+# codes to the model's (other languages fall back to the default model), "voice_cloning" passes the speaker wav
+MODEL_REGISTRY = {
+    "tts-1": {
+        "model": "tts_models/multilingual/multi-dataset/your_tts",
+        "languages": {"en": "en", "fr": "fr-fr", "pt": "pt-br"},
+        "voice_cloning": True
+    },
+    "tts-1-hd": {"model": "tts_models/multilingual/multi-dataset/xtts_v2"}
+}
+if os.getenv("MODEL_REGISTRY"):
+    MODEL_REGISTRY = json.loads(os.getenv("MODEL_REGISTRY"))
+
+
+class TTSManager:
+    """Loaded TTS models - the default model stays loaded, others are loaded on demand and evicted when idle or over budget"""
+    _instance = None
+    model_name = "tts_models/multilingual/multi-dataset/xtts_v2"  # Default model
+    sample_rate = 24000  # Output rate of the default model, updated once it is loaded - other models are resampled to it
+    load_seconds = 0.0
+    memory_budget = int(float(os.getenv("MODEL_MEMORY_MB", "0")) * 1024 * 1024)  # 0: no limit
+    idle_timeout = float(os.getenv("MODEL_IDLE_SECONDS", "900"))  # 0: keep loaded
+    cpu_precision = os.getenv("CPU_PRECISION", "fp32").lower()  # fp32, int8 or bf16 - ignored with CUDA
+    autocast_bf16 = False
+    stats = {"loads": 0, "evictions": 0}
+    _models = {}  # model name -> (model, bytes)
+    _last_used = {}  # model name -> monotonic time
+    _lock = threading.Lock()
+    _loading = set()  # Models being loaded by load_in_background
+    _loading_lock = threading.Lock()
+    _idle_thread = None
+
+    @classmethod
+    def get_model(cls, model_name: Optional[str] = None):
+        model_name = model_name or cls.model_name
+        entry = cls._models.get(model_name)
+        if entry is None:
+            with cls._lock:
+                # The default model is loaded in the background at startup - other threads wait instead of loading it twice
+                entry = cls._models.get(model_name) or cls._load(model_name)
+        cls._last_used[model_name] = time.monotonic()
+        return entry[0]
+
+    @classmethod
+    def is_loaded(cls, model_name: Optional[str] = None) -> bool:
+        return (model_name or cls.model_name) in cls._models
+
+    @classmethod
+    def load_in_background(cls, model_name: str, done: Callable[[str, Optional[Exception]], None]):
+        """Load a model on its own thread (idempotent) - done(model_name, error) is called once it is loaded or failed"""
+        with cls._loading_lock:
+            if model_name in cls._loading:
+                return
+            cls._loading.add(model_name)
+        threading.Thread(target=cls._load_in_background, args=(model_name, done), name="flextts-model-load", daemon=True).start()
+
+    @classmethod
+    def _load_in_background(cls, model_name: str, done: Callable[[str, Optional[Exception]], None]):
+        error = None
+        try:
+            cls.get_model(model_name)
+        except Exception as e:
+            log(f"ERROR loading TTS model {model_name}:", str(e))
+            error = e
+        finally:
+            with cls._loading_lock:
+                cls._loading.discard(model_name)
+        done(model_name, error)
+
+    @classmethod
+    def _load(cls, model_name: str):
+        # Called with the lock held
+        log(f"Loading TTS model {model_name}...")
+        if torch.cuda.is_available():
+            # Clear CUDA cache before loading model
+            torch.cuda.empty_cache()
+            # Set memory usage limits for CUDA
+            torch.cuda.set_per_process_memory_fraction(0.8)  # Use up to 80% of available VRAM
+        started = time.perf_counter()
+        model = TTS(model_name=model_name, gpu=torch.cuda.is_available())
+        if model_name == cls.model_name:
+            if not torch.cuda.is_available() and cls.cpu_precision != "fp32":
+                cls._optimize_for_cpu(model.synthesizer.tts_model)
+            cls.sample_rate = model.synthesizer.output_sample_rate
+            cls.load_seconds = time.perf_counter() - started
+        elif cls.idle_timeout > 0 and cls._idle_thread is None:
+            cls._idle_thread = threading.Thread(target=cls._evict_idle, name="flextts-model-eviction", daemon=True)
+            cls._idle_thread.start()
+
+        entry = cls._models[model_name] = (model, model_bytes(model))
+        cls._last_used[model_name] = time.monotonic()
+        cls.stats["loads"] += 1
+        Metrics.set("flextts_model_load_seconds", time.perf_counter() - started, model=model_name)
+
+        # Over budget: unload the least recently used models, never the default one or the one just loaded
+        while cls.memory_budget > 0 and sum(size for _, size in cls._models.values()) > cls.memory_budget:
+            candidates = [name for name in cls._models if name not in (model_name, cls.model_name)]
+            if not candidates:
+                break
+            cls._unload(min(candidates, key=lambda name: cls._last_used.get(name, 0)), "memory budget")
+        return entry
+
+    @classmethod
+    def _unload(cls, model_name: str, reason: str):
+        # Called with the lock held - a synthesis still using the model keeps it alive until it is done
+        del cls._models[model_name]
+        cls._last_used.pop(model_name, None)
+        cls.stats["evictions"] += 1
+        log(f"Unloaded TTS model {model_name} ({reason})")
+        cls.clear_cuda()
+
+    @classmethod
+    def _evict_idle(cls):
+        while True:
+            time.sleep(max(1.0, cls.idle_timeout / 4))
+            with cls._lock:
+                now = time.monotonic()
+                for model_name in [name for name in cls._models if name != cls.model_name]:
+                    if now - cls._last_used.get(model_name, now) > cls.idle_timeout:
+                        cls._unload(model_name, "idle")
+
+    @classmethod
+    def get_stats(cls):
+        with cls._lock:
+            now = time.monotonic()
+            return {
+                **cls.stats,
+                "default": cls.model_name,
+                "memory_budget_bytes": cls.memory_budget,
+                "idle_timeout_seconds": cls.idle_timeout,
+                "loaded": {name: {"bytes": size, "idle_seconds": now - cls._last_used.get(name, now)} for name, (_, size) in cls._models.items()}
+            }
+
+    @classmethod
+    def _optimize_for_cpu(cls, xtts):
+        """CPU_PRECISION: int8 dynamic quantization of the GPT (cached in data/quantized) or bf16 autocast"""
+        if cls.cpu_precision == "bf16":
+            cls.autocast_bf16 = cpu_supports_bf16()
+            log("CPU precision: " + ("bf16 autocast" if cls.autocast_bf16 else "bf16 is not supported by this CPU, using fp32"))
+            return
+        if cls.cpu_precision != "int8" or getattr(xtts, "gpt", None) is None:
+            log(f"CPU precision: {cls.cpu_precision} is not available for this model, using fp32")
+            return
+
+        # Key the disk cache by everything that changes the pickled modules
+        key = f"{cls.model_name}:{package_version('TTS')}:{torch.__version__}:{torch.backends.quantized.engine}:int8"
+        cache_file = os.path.join(quantized_path, hashlib.sha256(key.encode()).hexdigest() + ".pt")
+        if os.path.exists(cache_file):
+            try:
+                xtts.gpt = torch.load(cache_file, map_location="cpu", weights_only=False)
+                log("CPU precision: int8 GPT loaded from " + cache_file)
+                return
+            except Exception as e:
+                log(f"Error loading quantized model {cache_file}: {e}")
+
+        started = time.perf_counter()
+        with torch.no_grad():
+            conv1d_to_linear(xtts.gpt)
+            torch.ao.quantization.quantize_dynamic(xtts.gpt, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        log(f"CPU precision: int8 GPT quantized in {time.perf_counter() - started:.1f}s")
+        try:
+            # Write atomically, replica processes may share data/quantized
+            if not os.path.exists(quantized_path):
+                os.makedirs(quantized_path, exist_ok=True)
+            temp_file = cache_file + f".{os.getpid()}.tmp"
+            torch.save(xtts.gpt, temp_file)
+            os.replace(temp_file, cache_file)
+        except Exception as e:
+            log(f"Error saving quantized model {cache_file}: {e}")
+
+    @classmethod
+    def clear_cuda(cls):
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+def model_bytes(model) -> int:
+    """Memory of the parameters and buffers of a loaded Coqui model"""
+    module = getattr(getattr(model, "synthesizer", None), "tts_model", None)
+    if not isinstance(module, torch.nn.Module):
+        return 0
+    return sum(tensor.numel() * tensor.element_size() for tensor in list(module.parameters()) + list(module.buffers()))
+
+
+def resolve_model(model_id: str, language: str) -> Optional[str]:
+    """Coqui model for an OpenAI model id and language (the default model if the id's model lacks the language), None if unknown"""
+    spec = MODEL_REGISTRY.get(model_id)
+    if spec is None:
+        return None
+    if "languages" in spec and language not in spec["languages"]:
+        return TTSManager.model_name
+    return spec["model"]
+
+
+def conv1d_to_linear(module: torch.nn.Module):
+    """Replace GPT-2's Conv1D projections (transformers) with equivalent nn.Linear layers, which torch can quantize"""
+    for name, child in module.named_children():
+        if type(child).__name__ == "Conv1D" and hasattr(child, "nf"):
+            # Conv1D computes x @ weight + bias with weight shaped (in, out)
+            linear = torch.nn.Linear(child.weight.shape[0], child.nf)
+            linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous(), requires_grad=False)
+            linear.bias = torch.nn.Parameter(child.bias.detach().clone(), requires_grad=False)
+            setattr(module, name, linear)
+        else:
+            conv1d_to_linear(child)
+
+
+def cpu_supports_bf16() -> bool:
+    """Native bf16 instructions (AVX512-BF16 or AMX) - emulated bf16 is slower than fp32"""
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            flags = cpuinfo.read()
+    except OSError:
+        return False
+    return torch.backends.mkldnn.is_available() and ("avx512_bf16" in flags or "amx_bf16" in flags)
+
+
+def package_version(name: str) -> str:
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def cpu_model() -> str:
+    """Name of the CPU, for telling hosts apart"""
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def set_torch_threads(threads: int = 0, interop_threads: int = 0):
+    """Intra-op and inter-op threads of this process - 0 keeps the torch default"""
+    if threads > 0:
+        torch.set_num_threads(threads)
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # Only possible before torch ran anything in parallel
+            log("Inter-op threads not changed:", str(e))
+
+
+class SpeakerLatentCache:
+    """XTTS conditioning latents per speaker wav - kept in memory and persisted to data/latents"""
+    _latents = {}  # (model name, speaker_wav) -> (mtime_ns, size, gpt_cond_latent, speaker_embedding)
+    _key_locks = {}  # (model name, speaker_wav) -> lock held while its latents are computed
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, speaker_wav: str, model_name: Optional[str] = None):
+        """Return (gpt_cond_latent, speaker_embedding) for a speaker wav, computing them only if the file changed"""
+        model_name = model_name or TTSManager.model_name
+        key = (model_name, speaker_wav)
+        stat = os.stat(speaker_wav)
+        cached = cls._latents.get(key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2], cached[3]
+
+        # Only requests for the same speaker wait for the computation
+        with cls._key_lock(key):
+            # Another thread may have filled the cache while we were waiting
+            cached = cls._latents.get(key)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                return cached[2], cached[3]
+
+            cache_file = cls._cache_file(model_name, speaker_wav, stat.st_mtime_ns)
+            latents = None
+            if os.path.exists(cache_file):
+                try:
+                    data = torch.load(cache_file, map_location="cpu")
+                    latents = (data["gpt_cond_latent"], data["speaker_embedding"])
+                except Exception as e:
+                    log(f"Error loading cached latents {cache_file}: {e}")
+
+            if latents is None:
+                if DEBUG:
+                    log("Computing speaker latents: " + speaker_wav)
+                xtts = TTSManager.get_model(model_name).synthesizer.tts_model
+                with torch.inference_mode(), silence_stdout():
+                    latents = xtts.get_conditioning_latents(
+                        audio_path=speaker_wav,
+                        gpt_cond_len=xtts.config.gpt_cond_len,
+                        gpt_cond_chunk_len=xtts.config.gpt_cond_chunk_len,
+                        max_ref_length=xtts.config.max_ref_len,
+                        sound_norm_refs=xtts.config.sound_norm_refs
+                    )
+                try:
+                    # Write atomically, replica processes may share data/latents
+                    temp_file = cache_file + f".{os.getpid()}.tmp"
+                    torch.save({
+                        "speaker_wav": speaker_wav,
+                        "model_name": model_name,
+                        "gpt_cond_latent": latents[0].cpu(),
+                        "speaker_embedding": latents[1].cpu()
+                    }, temp_file)
+                    os.replace(temp_file, cache_file)
+                except Exception as e:
+                    log(f"Error saving latents {cache_file}: {e}")
+
+            device = TTSManager.get_model(model_name).synthesizer.tts_model.device
+            latents = (latents[0].to(device), latents[1].to(device))
+            cls._latents[key] = (stat.st_mtime_ns, stat.st_size, latents[0], latents[1])
+            return latents
+
+    @classmethod
+    def _key_lock(cls, key: tuple) -> threading.Lock:
+        with cls._lock:
+            return cls._key_locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _cache_file(model_name: str, speaker_wav: str, mtime_ns: int) -> str:
+        # Key the disk cache by model, wav content and mtime
+        digest = hashlib.sha256(f"{model_name}:{mtime_ns}:".encode())
+        with open(speaker_wav, 'rb') as wav_file:
+            digest.update(wav_file.read())
+        return os.path.join(latent_path, digest.hexdigest() + ".pt")
+
+    @classmethod
+    def precompute(cls):
+        """Compute latents for every speaker wav so the first request per voice is fast, then prune stale ones"""
+        count = 0
+        for language in sorted(os.listdir(speaker_path)):
+            language_path = os.path.join(speaker_path, language)
+            if not os.path.isdir(language_path):
+                continue
+            for file in sorted(os.listdir(language_path)):
+                if file.endswith('.wav'):
+                    try:
+                        cls.get(os.path.join(language_path, file))
+                        count += 1
+                    except Exception as e:
+                        log(f"Error computing latents for {language}/{file}: {e}")
+        log(f"Speaker latents ready for {count} speakers")
+        cls.prune()
+
+    @classmethod
+    def prune(cls):
+        """Delete persisted latents of speaker wavs that were removed or replaced since they were computed"""
+        removed = 0
+        for file in os.listdir(latent_path):
+            if not file.endswith('.pt'):
+                continue
+            cache_file = os.path.join(latent_path, file)
+            try:
+                data = torch.load(cache_file, map_location="cpu")
+                speaker_wav = data["speaker_wav"]
+                # Files written before the model name was stored belong to the default model
+                model_name = data.get("model_name", TTSManager.model_name)
+                stale = not os.path.exists(speaker_wav) or cls._cache_file(model_name, speaker_wav, os.stat(speaker_wav).st_mtime_ns) != cache_file
+            except Exception as e:
+                log(f"Error checking cached latents {cache_file}: {e}")
+                stale = True
+            if stale:
+                try:
+                    os.remove(cache_file)
+                    removed += 1
+                except OSError as e:
+                    log(f"Error removing cached latents {cache_file}: {e}")
+        with cls._lock:
+            for key in [key for key in cls._latents if not os.path.exists(key[1])]:
+                del cls._latents[key]
+                cls._key_locks.pop(key, None)
+        if removed:
+            log(f"Removed {removed} stale speaker latents")
+
+
+SENTENCE_PAUSE_SAMPLES = 10000  # Pause between sentences, same as TTS.tts_to_file
+SENTENCE_FADE_SAMPLES = 240  # 10ms fade at sentence edges (24kHz) to avoid clicks
+SEGMENT_MAX_CHARS = int(os.getenv("SEGMENT_MAX_CHARS", "250"))  # Longer sentences are split at commas / spaces
+SEGMENT_CROSSFADE_SAMPLES = int(float(os.getenv("SEGMENT_CROSSFADE_MS", "20")) * 24)  # Crossfade where a sentence was split
+
+
+def split_sentences(text: str, language: str) -> List[str]:
+    """Split text into sentences using pysbd rules for the language (English rules as fallback)"""
+    try:
+        segmenter = pysbd.Segmenter(language=language.split('-')[0].lower(), clean=False)
+    except ValueError:
+        segmenter = pysbd.Segmenter(language="en", clean=False)
+    return [sentence.strip() for sentence in segmenter.segment(text) if sentence.strip()]
+
+
+def split_segments(text: str, language: str, max_chars: int = SEGMENT_MAX_CHARS) -> List[tuple]:
+    """Split text into (segment, ends_sentence) - sentences, with overlong ones cut at punctuation or spaces"""
+    segments = []
+    for sentence in split_sentences(text, language):
+        while len(sentence) > max_chars:
+            cut = max(sentence.rfind(separator, 0, max_chars) for separator in (', ', '; ', ': ', ' - ', ' '))
+            cut = cut + 1 if cut > 0 else max_chars
+            segments.append((sentence[:cut].strip(), False))
+            sentence = sentence[cut:].strip()
+        if sentence:
+            segments.append((sentence, True))
+    return segments
+
+
+class SegmentFeed:
+    """Segments of a text, possibly still arriving - bounded, so a fast writer waits for synthesis (backpressure)"""
+
+    def __init__(self, language: str, max_pending: int = 0):
+        self.language = language
+        self.max_pending = max_pending  # 0: unbounded
+        self.incremental = True
+        self.characters = 0
+        self.closed = False
+        self._segments = deque()
+        self._cond = threading.Condition()
+
+    @classmethod
+    def of_text(cls, text: str, language: str) -> "SegmentFeed":
+        """A feed with the complete text"""
+        feed = cls(language)
+        feed.incremental = False
+        feed.put(text)
+        feed.close()
+        return feed
+
+    def put(self, text: str) -> bool:
+        """Add text ending at a sentence boundary - blocks while max_pending segments wait, False once closed"""
+        for segment in split_segments(text, self.language):
+            with self._cond:
+                while self.max_pending and len(self._segments) >= self.max_pending and not self.closed:
+                    self._cond.wait()
+                if self.closed:
+                    return False
+                self._segments.append(segment)
+                self.characters += len(segment[0])
+                self._cond.notify_all()
+        return True
+
+    def close(self):
+        """End of the text - or the reader is gone, then writers stop"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def take(self) -> Optional[tuple]:
+        """Next (segment, ends_sentence) if one is available, without waiting"""
+        with self._cond:
+            if not self._segments:
+                return None
+            self._cond.notify_all()
+            return self._segments.popleft()
+
+    def wait(self, timeout: float):
+        with self._cond:
+            if not self._segments and not self.closed:
+                self._cond.wait(timeout)
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._segments)
+
+    @property
+    def finished(self) -> bool:
+        with self._cond:
+            return self.closed and not self._segments
+
+
+def infer_sentence(text: str, language: str, speaker_wav: str, model_name: Optional[str] = None) -> tuple:
+    """Run XTTS inference for one sentence with cached speaker latents - returns (waveform, stage timings)"""
+    model_name = model_name or TTSManager.model_name
+    if "xtts" not in model_name:
+        return infer_sentence_generic(text, language, speaker_wav, model_name)
+    xtts = TTSManager.get_model(model_name).synthesizer.tts_model
+    started = time.perf_counter()
+    gpt_cond_latent, speaker_embedding = SpeakerLatentCache.get(speaker_wav, model_name)
+    conditioned = time.perf_counter()
+    with torch.inference_mode(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=TTSManager.autocast_bf16), silence_stdout():
+        outputs = xtts.inference(
+            text=text,
+            language=language,
+            gpt_cond_latent=gpt_cond_latent,
+            speaker_embedding=speaker_embedding,
+            temperature=xtts.config.temperature,
+            length_penalty=xtts.config.length_penalty,
+            repetition_penalty=xtts.config.repetition_penalty,
+            top_k=xtts.config.top_k,
+            top_p=xtts.config.top_p
+        )
+    wav = outputs["wav"]
+    if torch.is_tensor(wav):
+        wav = wav.float().cpu().numpy()
+    timings = {"conditioning": conditioned - started, "inference": time.perf_counter() - conditioned}
+    return np.asarray(wav, dtype=np.float32).squeeze(), timings
+
+
+def infer_sentence_generic(text: str, language: str, speaker_wav: str, model_name: str) -> tuple:
+    """Run any other Coqui model via TTS.tts() - resampled to the output rate of the default model"""
+    spec = next((spec for spec in MODEL_REGISTRY.values() if spec["model"] == model_name), {})
+    model = TTSManager.get_model(model_name)
+    options = {}
+    if "languages" in spec:
+        options["language"] = spec["languages"].get(language, language)
+    if spec.get("voice_cloning"):
+        options["speaker_wav"] = speaker_wav
+    started = time.perf_counter()
+    with torch.inference_mode(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=TTSManager.autocast_bf16), silence_stdout():
+        wav = model.tts(text=text, split_sentences=False, **options)
+    wav = np.asarray(wav, dtype=np.float32).squeeze()
+    if model.synthesizer.output_sample_rate != TTSManager.sample_rate:
+        if torchaudio_functional is None:
+            raise RuntimeError(f"{model_name} speaks at {model.synthesizer.output_sample_rate}Hz - resampling it needs torchaudio")
+        wav = torchaudio_functional.resample(torch.from_numpy(wav), model.synthesizer.output_sample_rate, TTSManager.sample_rate).numpy()
+    return wav, {"inference": time.perf_counter() - started}
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot take another request"""
+
+    def __init__(self, retry_after: int, message: str = "Server is busy, please retry later"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ModelNotReadyError(QueueFullError):
+    """Raised while the model is still loading or warming up"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after, "Model is loading, please retry later")
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the deadline of a request passed before its audio was ready"""
+
+    def __init__(self, message: str = "Deadline exceeded before the audio was ready"):
+        super().__init__(message)
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client went away while its audio was being synthesized"""
+
+
+class InvalidParameterError(ValueError):
+    """Raised for an invalid request parameter"""
+
+    def __init__(self, param: str, message: str):
+        super().__init__(message)
+        self.param = param
+
+
+# Priority lanes, highest first - the scheduler serves them in proportion to their weights
+PRIORITY_LANES = ("interactive", "standard", "background")
+DEFAULT_PRIORITY = os.getenv("DEFAULT_PRIORITY", "interactive")
+
+if DEFAULT_PRIORITY not in PRIORITY_LANES:
+    raise ValueError("Fatal Error: DEFAULT_PRIORITY must be one of " + ", ".join(PRIORITY_LANES), DEFAULT_PRIORITY)
+
+
+class SynthesisFuture(Future):
+    """Result of one queued sentence for one caller"""
+    inference_seconds = 0.0  # Time the model spent on it, to account for wasted work
+
+
+class SynthesisJob:
+    """One sentence waiting for inference"""
+
+    def __init__(self, text: str, language: str, speaker_wav: str, model_name: Optional[str] = None,
+                 priority: str = DEFAULT_PRIORITY, deadline: Optional[float] = None):
+        self.text = text
+        self.language = language
+        self.speaker_wav = speaker_wav
+        self.model_name = model_name
+        self.voice = (model_name, language, speaker_wav)
+        self.priority = priority
+        self.deadline = deadline  # time.monotonic() after which nobody waits for it any more, None for no deadline
+        self.key = (text,) + self.voice
+        self.future = SynthesisFuture()
+        self.futures = [self.future]  # One per caller - identical sentences queued while this one is in flight join it
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        self.labels = Metrics.labels()  # Metrics labels of the request that queued the sentence
+        self.profile = Profiler.current()  # Profile directory if the request is profiled
+
+
+class ReplicaError(Exception):
+    """Raised when a replica process died or stopped responding"""
+
+
+class ModelReplica:
+    """Worker process with its own model - driven by exactly one scheduler dispatcher thread"""
+    start_timeout = float(os.getenv("REPLICA_START_TIMEOUT", "900"))
+    ping_timeout = float(os.getenv("REPLICA_PING_TIMEOUT", "10"))
+    synth_timeout = float(os.getenv("REPLICA_SYNTH_TIMEOUT", "300"))  # 0: no limit
+
+    def __init__(self, index: int, threads: int, cpus: Optional[List[int]] = None, interop_threads: int = 0):
+        self.index = index
+        self.threads = threads
+        self.cpus = cpus
+        self.interop_threads = interop_threads
+        self.process = None
+        self.conn = None
+        self.jobs = 0
+        self.restarts = 0
+        self.busy = False
+        self.ready = False
+
+    def start(self):
+        """Spawn the process and wait until its model is loaded"""
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=replica_main,
+            args=(child_conn, self.threads, self.cpus, self.interop_threads),
+            name=f"flextts-replica-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        log(f"Replica {self.index}: started (pid {self.process.pid}, {self.threads} threads" + (f", cpus {self.cpus})" if self.cpus else ")"))
+        kind, payload = self._receive(self.start_timeout)
+        if kind != "ready":
+            raise ReplicaError(f"Replica {self.index} failed to start: {payload}")
+        TTSManager.sample_rate, load_seconds = payload
+        Metrics.set("flextts_model_load_seconds", load_seconds, replica=str(self.index))
+        self.ready = True
+
+    def stop(self):
+        self.ready = False
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join(5)
+
+    def restart(self):
+        log(f"Replica {self.index}: restarting")
+        self.restarts += 1
+        self.stop()
+        self.start()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def ping(self) -> bool:
+        """Health check - the process must answer within ping_timeout"""
+        try:
+            self.conn.send(("ping", None))
+            return self._receive(self.ping_timeout)[0] == "pong"
+        except (ReplicaError, OSError):
+            return False
+
+    def synthesize(self, text: str, language: str, speaker_wav: str, model_name: Optional[str] = None, profile: Optional[str] = None) -> tuple:
+        """Synthesize one sentence in the process - profiled there if a profile prefix is given"""
+        try:
+            self.busy = True
+            self.conn.send(("synthesize", (text, language, speaker_wav, model_name, profile)))
+            # A replica that hangs mid-synthesis raises ReplicaError here, so it is restarted like a crashed one
+            kind, payload = self._receive(self.synth_timeout or None)
+        except OSError as e:
+            raise ReplicaError(f"Replica {self.index} is not reachable: {e}")
+        finally:
+            self.busy = False
+        self.jobs += 1
+        if kind == "error":
+            raise RuntimeError(payload)
+        return payload
+
+    def _receive(self, timeout: Optional[float] = None):
+        # Poll in small steps so a crashed process is noticed right away
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.conn.poll(1.0):
+            if not self.process.is_alive():
+                raise ReplicaError(f"Replica {self.index} exited with code {self.process.exitcode}")
+            if deadline is not None and time.monotonic() > deadline:
+                raise ReplicaError(f"Replica {self.index} did not answer within {timeout:.0f}s")
+        try:
+            return self.conn.recv()
+        except EOFError:
+            raise ReplicaError(f"Replica {self.index} closed the connection")
+
+    def get_stats(self):
+        return {
+            "index": self.index,
+            "pid": self.process.pid if self.process is not None else None,
+            "alive": self.is_alive(),
+            "ready": self.ready,
+            "busy": self.busy,
+            "threads": self.threads,
+            "interop_threads": self.interop_threads,
+            "cpus": self.cpus,
+            "jobs": self.jobs,
+            "restarts": self.restarts
+        }
+
+
+def replica_main(conn, threads: int, cpus: Optional[List[int]], interop_threads: int = 0):
+    """Entry point of a replica process: synthesize sentences sent over the pipe"""
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    set_torch_threads(threads, interop_threads)
+    try:
+        TTSManager.get_model()
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+    # Warm up before taking jobs, so restarted replicas are fast right away as well
+    for job in warm_up_jobs():
+        try:
+            infer_sentence(*job)
+        except Exception as e:
+            log("Warm-up failed:", str(e))
+    conn.send(("ready", (TTSManager.sample_rate, TTSManager.load_seconds)))
+
+    while True:
+        try:
+            kind, payload = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if kind == "ping":
+            conn.send(("pong", None))
+        elif kind == "synthesize":
+            try:
+                *job, profile = payload
+                with Profiler.inference(profile):
+                    result = infer_sentence(*job)
+                conn.send(("ok", result))
+            except Exception as e:
+                conn.send(("error", str(e)))
+
+
+class InferenceScheduler:
+    """Single owner of the model - queued sentences run in micro-batches grouped by voice on a worker thread"""
+    max_queue = int(os.getenv("QUEUE_MAX_SIZE", "16"))
+    max_batch = int(os.getenv("BATCH_MAX_SIZE", "8"))
+    max_wait = float(os.getenv("BATCH_MAX_WAIT_MS", "0")) / 1000
+    replica_count = int(os.getenv("REPLICAS", "0"))
+    threads = int(os.getenv("REPLICA_THREADS", "0"))  # Torch threads per replica (or of the server process without replicas), 0: default
+    interop_threads = int(os.getenv("INTEROP_THREADS", "0"))
+    pin_cpus = os.getenv("REPLICA_CPU_AFFINITY", "false").lower() == "true"
+    health_interval = float(os.getenv("REPLICA_HEALTH_INTERVAL", "30"))
+    weights = {lane: float(weight) for lane, weight in zip(PRIORITY_LANES, (8, 3, 1))}
+    weights.update({lane.strip(): float(weight) for lane, weight in (item.split("=") for item in os.getenv("PRIORITY_WEIGHTS", "").split(",") if "=" in item)})
+    if set(weights) != set(PRIORITY_LANES) or min(weights.values()) <= 0:
+        raise ValueError("Fatal Error: PRIORITY_WEIGHTS must set positive weights for " + ", ".join(PRIORITY_LANES), os.getenv("PRIORITY_WEIGHTS"))
+    stats = {"jobs": 0, "batches": 0, "rejected": 0, "failed": 0, "retried": 0, "coalesced": 0, "expired": 0, "cancelled": 0,
+             "wasted_seconds": 0.0, "queue_wait_seconds": 0.0, "inference_seconds": 0.0, "max_batch_size": 0}
+    lane_stats = {lane: {"jobs": 0, "queue_wait_seconds": 0.0} for lane in PRIORITY_LANES}
+    _credits = {lane: 0.0 for lane in PRIORITY_LANES}  # Smooth weighted round robin between the lanes
+    _queue = []  # SynthesisJob, oldest first
+    _inflight = {}  # SynthesisJob.key -> queued or running job
+    _cond = threading.Condition()
+    _workers = []
+    _replicas = []
+
+    @classmethod
+    def start(cls):
+        """Start the worker thread - or one dispatcher thread per replica process (idempotent)"""
+        with cls._cond:
+            if cls._workers:
+                return
+            if cls.replica_count > 0:
+                cls._replicas += cls.create_replicas(cls.replica_count, cls.threads, cls.interop_threads)
+                targets = [(f"flextts-dispatch-{replica.index}", replica) for replica in cls._replicas]
+            else:
+                targets = [("flextts-inference", None)]
+            for name, replica in targets:
+                worker = threading.Thread(target=cls._loop, args=(replica,), name=name, daemon=True)
+                cls._workers.append(worker)
+                worker.start()
+
+    @staticmethod
+    def cpu_ids() -> List[int]:
+        """Cores this process may use"""
+        return sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+
+    @classmethod
+    def create_replicas(cls, count: int, threads: int = 0, interop_threads: int = 0) -> List[ModelReplica]:
+        """Replicas sharing the available cores - not started yet"""
+        cpu_ids = cls.cpu_ids()
+        threads = threads or max(1, len(cpu_ids) // count)
+        replicas = []
+        for index in range(count):
+            cpus = cpu_ids[index * threads:(index + 1) * threads] if cls.pin_cpus else None
+            replicas.append(ModelReplica(index, threads, cpus or None, interop_threads))
+        return replicas
+
+    @classmethod
+    def retry_after(cls) -> int:
+        """Rough number of seconds until the queue has room again"""
+        jobs = max(1, cls.stats["jobs"])
+        return max(1, math.ceil(cls.stats["inference_seconds"] / jobs * (len(cls._queue) + 1) / max(1, len(cls._workers))))
+
+    @classmethod
+    def check_capacity(cls, priority: str = DEFAULT_PRIORITY):
+        """Raise QueueFullError if a new request would not be admitted"""
+        if not ModelLoader.is_ready():
+            raise ModelNotReadyError(ModelLoader.retry_after)
+        with cls._cond:
+            if cls._depth(priority) >= cls.max_queue:
+                cls.stats["rejected"] += 1
+                raise QueueFullError(cls.retry_after())
+
+    @classmethod
+    def _depth(cls, priority: str) -> int:
+        # Called with the condition held - queued background work never keeps the other lanes out
+        if priority == "background":
+            return len(cls._queue)
+        return sum(1 for job in cls._queue if job.priority != "background")
+
+    @classmethod
+    def submit(cls, text: str, language: str, speaker_wav: str, admitted: bool = False, model_name: Optional[str] = None,
+               priority: str = DEFAULT_PRIORITY, coalesce: bool = True, deadline: Optional[float] = None) -> SynthesisFuture:
+        """Queue one sentence in a priority lane - follow-up sentences of an admitted request bypass the queue limit
+
+        An identical sentence that is already queued or running is not synthesized again: the caller gets its own
+        future for the same job, so cancelling it does not affect the other callers.
+        """
+        if not admitted and not ModelLoader.is_ready():
+            raise ModelNotReadyError(ModelLoader.retry_after)
+        cls.start()
+        job = SynthesisJob(text, language, speaker_wav, model_name, priority, deadline)
+        with cls._cond:
+            leader = cls._inflight.get(job.key) if coalesce else None
+            if leader is not None:
+                # The shared job runs in the best lane and until the latest deadline of its callers
+                leader.priority = min(leader.priority, priority, key=PRIORITY_LANES.index)
+                leader.deadline = None if leader.deadline is None or deadline is None else max(leader.deadline, deadline)
+                leader.profile = leader.profile or job.profile
+                leader.futures.append(job.future)
+                cls.stats["coalesced"] += 1
+                return job.future
+            if not admitted and cls._depth(priority) >= cls.max_queue:
+                cls.stats["rejected"] += 1
+                raise QueueFullError(cls.retry_after())
+            cls._queue.append(job)
+            if coalesce:
+                cls._inflight[job.key] = job
+            cls._cond.notify()
+        return job.future
+
+    @classmethod
+    def _next_batch(cls, replica: Optional[ModelReplica] = None):
+        # Called with the condition held: the oldest job of the next lane plus queued jobs for the same voice
+        now = time.monotonic()
+        for job in [job for job in cls._queue if job.deadline is not None and job.deadline < now]:
+            cls._queue.remove(job)
+            cls.stats["expired"] += 1
+            Metrics.inc("flextts_dropped_sentences_total", reason="expired", **job.labels)
+            cls._resolve(job, exception=DeadlineExceededError())
+        if not cls._queue:
+            return []
+        # Replicas load their models themselves - here a model that is not loaded yet must not block the worker
+        queue = cls._queue if replica is not None else cls._runnable()
+        if not queue:
+            # Only sentences for models that are still loading - wait for a load, a new sentence or a deadline
+            cls._cond.wait(1.0)
+            return []
+
+        # Smooth weighted round robin: every waiting lane earns its weight, the richest lane pays the sum
+        waiting = {job.priority for job in queue}
+        for lane in waiting:
+            cls._credits[lane] += cls.weights[lane]
+        lane = max(waiting, key=lambda name: (cls._credits[name], -PRIORITY_LANES.index(name)))
+        cls._credits[lane] -= sum(cls.weights[name] for name in waiting)
+
+        first = next(job for job in queue if job.priority == lane)
+        deadline = first.enqueued_at + cls.max_wait
+        while True:
+            batch = [job for job in cls._queue if job.voice == first.voice and job.priority == first.priority][:cls.max_batch]
+            remaining = deadline - time.monotonic()
+            if len(batch) >= cls.max_batch or remaining <= 0:
+                break
+            cls._cond.wait(remaining)
+        for job in batch:
+            cls._queue.remove(job)
+        return batch
+
+    @classmethod
+    def _runnable(cls) -> List[SynthesisJob]:
+        # Called with the condition held - sentences for a model that is not loaded wait while a loader thread loads it
+        runnable = []
+        for job in cls._queue:
+            model_name = job.model_name or TTSManager.model_name
+            if TTSManager.is_loaded(model_name):
+                runnable.append(job)
+            else:
+                TTSManager.load_in_background(model_name, cls._model_loaded)
+        return runnable
+
+    @classmethod
+    def _model_loaded(cls, model_name: str, error: Optional[Exception]):
+        """Wake the worker for the sentences of a loaded model - or fail them if it could not be loaded"""
+        with cls._cond:
+            failed = [job for job in cls._queue if (job.model_name or TTSManager.model_name) == model_name] if error is not None else []
+            for job in failed:
+                cls._queue.remove(job)
+                cls.stats["failed"] += 1
+            cls._cond.notify_all()
+        for job in failed:
+            cls._resolve(job, exception=error)
+
+    @classmethod
+    def _loop(cls, replica: Optional[ModelReplica] = None):
+        if replica is not None:
+            cls._ensure_replica(replica)
+        while True:
+            with cls._cond:
+                while not cls._queue:
+                    if not cls._cond.wait(cls.health_interval) and replica is not None:
+                        break
+                batch = cls._next_batch(replica) if cls._queue else None
+            if replica is not None:
+                # Idle health check, or make sure the process is still there before dispatching
+                cls._ensure_replica(replica, ping=batch is None)
+            if batch:
+                cls._run_batch(batch, replica)
+
+    @classmethod
+    def _ensure_replica(cls, replica: ModelReplica, restart: bool = False, ping: bool = False):
+        # Keep a replica running - a crashed process is restarted, never the whole server
+        while True:
+            try:
+                if replica.process is None:
+                    replica.start()
+                elif restart or not replica.is_alive() or (ping and not replica.ping()):
+                    replica.restart()
+                return
+            except ReplicaError as e:
+                log("ERROR:", str(e))
+                restart = True
+                time.sleep(5)
+
+    @classmethod
+    def _run_batch(cls, batch, replica: Optional[ModelReplica] = None):
+        started = time.monotonic()
+        ran = []  # Without cancelled and requeued jobs, which would skew batch sizes and queue wait
+        for job in batch:
+            with cls._cond:
+                if all(future.cancelled() for future in job.futures):
+                    # Every caller is gone
+                    cls._release(job)
+                    cls.stats["cancelled"] += 1
+                    Metrics.inc("flextts_dropped_sentences_total", reason="cancelled", **job.labels)
+                    continue
+            Metrics.observe("flextts_stage_duration_seconds", time.monotonic() - job.enqueued_at, stage="queue_wait", **job.labels)
+            profile = Profiler.sentence_prefix(job.profile) if job.profile else None
+            job_started = time.monotonic()
+            try:
+                if replica is None:
+                    with Profiler.inference(profile):
+                        wav, timings = infer_sentence(job.text, job.language, job.speaker_wav, job.model_name)
+                else:
+                    wav, timings = replica.synthesize(job.text, job.language, job.speaker_wav, job.model_name, profile)
+                for stage, seconds in timings.items():
+                    Metrics.observe("flextts_stage_duration_seconds", seconds, stage=stage, **job.labels)
+                cls._resolve(job, wav, time.monotonic() - job_started)
+            except ReplicaError as e:
+                log("ERROR:", str(e))
+                cls._ensure_replica(replica, restart=True)
+                with cls._cond:
+                    if job.attempts < 2:
+                        # Give the sentence another chance on a healthy replica
+                        job.attempts += 1
+                        cls.stats["retried"] += 1
+                        cls._queue.insert(0, job)
+                        cls._cond.notify()
+                        continue
+                    cls.stats["failed"] += 1
+                cls._resolve(job, exception=e)
+            except Exception as e:
+                with cls._cond:
+                    cls.stats["failed"] += 1
+                cls._resolve(job, exception=e)
+            ran.append(job)
+        finished = time.monotonic()
+
+        with cls._cond:
+            cls.stats["inference_seconds"] += finished - started
+            if not ran:
+                return
+            cls.stats["batches"] += 1
+            cls.stats["jobs"] += len(ran)
+            cls.stats["max_batch_size"] = max(cls.stats["max_batch_size"], len(ran))
+            for job in ran:
+                cls.stats["queue_wait_seconds"] += started - job.enqueued_at
+                cls.lane_stats[job.priority]["jobs"] += 1
+                cls.lane_stats[job.priority]["queue_wait_seconds"] += started - job.enqueued_at
+
+    @classmethod
+    def _release(cls, job: SynthesisJob):
+        # Called with the condition held - later identical sentences start a new job
+        if cls._inflight.get(job.key) is job:
+            del cls._inflight[job.key]
+
+    @classmethod
+    def _resolve(cls, job: SynthesisJob, wav: Optional[np.ndarray] = None, seconds: float = 0.0, exception: Optional[Exception] = None):
+        """Hand the result to every caller that is still waiting"""
+        with cls._cond:
+            cls._release(job)
+            futures = list(job.futures)
+        delivered = False
+        for future in futures:
+            if future.set_running_or_notify_cancel():
+                delivered = True
+                if exception is not None:
+                    future.set_exception(exception)
+                else:
+                    future.inference_seconds = seconds
+                    future.set_result(wav)
+        if not delivered and exception is None:
+            # Every caller left while the model was working on it
+            cls.record_waste(seconds, "abandoned", job.labels)
+
+    @classmethod
+    def record_waste(cls, seconds: float, reason: str, labels: dict):
+        with cls._cond:
+            cls.stats["wasted_seconds"] += seconds
+        Metrics.inc("flextts_wasted_inference_seconds_total", seconds, reason=reason, **labels)
+
+    @classmethod
+    def get_stats(cls):
+        with cls._cond:
+            jobs = max(1, cls.stats["jobs"])
+            return {
+                **cls.stats,
+                "queue_depth": len(cls._queue),
+                "inflight": len(cls._inflight),
+                "lanes": {
+                    lane: {
+                        "weight": cls.weights[lane],
+                        "queued": sum(1 for job in cls._queue if job.priority == lane),
+                        "jobs": stats["jobs"],
+                        "avg_queue_wait_ms": stats["queue_wait_seconds"] / max(1, stats["jobs"]) * 1000
+                    } for lane, stats in cls.lane_stats.items()
+                },
+                "max_queue": cls.max_queue,
+                "max_batch": cls.max_batch,
+                "max_wait_ms": cls.max_wait * 1000,
+                "avg_batch_size": cls.stats["jobs"] / max(1, cls.stats["batches"]),
+                "avg_queue_wait_ms": cls.stats["queue_wait_seconds"] / jobs * 1000,
+                "avg_inference_ms": cls.stats["inference_seconds"] / jobs * 1000,
+                "workers_alive": sum(1 for worker in cls._workers if worker.is_alive()),
+                "replicas": [replica.get_stats() for replica in cls._replicas]
+            }
+
+
+def synthesize_segments(text: Union[str, SegmentFeed], language: str, speaker_wav: str, model_name: Optional[str] = None, priority: str = DEFAULT_PRIORITY,
+                        deadline: Optional[float] = None, disconnected: Optional[Callable[[], bool]] = None):
+    """Synthesize segment by segment and yield the waveforms in order, each as soon as it is ready
+
+    Up to SEGMENT_PARALLEL segments are queued at once, so long texts are spread over all replicas
+    while only a bounded window of audio is held in memory. Segments of multi-segment texts are cached
+    individually - a failed or repeated long request does not start from scratch. While waiting, the
+    deadline and the client connection are checked, and the remaining segments are dropped if either is gone.
+    The text can be a SegmentFeed that is still being written: segments are queued as they arrive.
+    """
+    feed = text if isinstance(text, SegmentFeed) else SegmentFeed.of_text(text, language)
+    parallel = int(os.getenv("SEGMENT_PARALLEL", "0")) or InferenceScheduler.replica_count + 1
+    use_cache = (feed.incremental or len(feed) > 1) and priority != "background"  # Bulk work would flush the cache
+    fade_in = np.linspace(0.0, 1.0, SENTENCE_FADE_SAMPLES, dtype=np.float32)
+    pending = deque()  # (future or waveform, cache key, ends_sentence) in text order
+    admitted = False
+
+    def submit(segment, ends_sentence):
+        nonlocal admitted
+        key = AudioCache.key(segment, language, speaker_wav, model_name or TTSManager.model_name, 'segment') if use_cache else None
+        cached = AudioCache.get(key) if use_cache else None
+        if cached is not None:
+            pending.append((np.frombuffer(cached, dtype='<i2').astype(np.float32) / 32767, None, ends_sentence))
+        else:
+            pending.append((InferenceScheduler.submit(segment, language, speaker_wav, admitted, model_name, priority, deadline=deadline), key, ends_sentence))
+            admitted = True
+
+    def check():
+        if disconnected is not None and disconnected():
+            raise ClientDisconnectedError("Client disconnected")
+        if deadline is not None and time.monotonic() > deadline:
+            raise DeadlineExceededError()
+
+    def wait(future):
+        while True:
+            try:
+                return future.result(timeout=0.25)
+            except FutureTimeoutError:
+                check()
+
+    tail = None  # End of the previous segment, kept back to crossfade it into the next one
+    started = time.perf_counter()
+    audio_samples = 0
+    try:
+        while True:
+            while len(pending) < parallel:
+                segment = feed.take()
+                if segment is None:
+                    break
+                submit(*segment)
+            if not pending:
+                if feed.finished:
+                    break
+                feed.wait(0.25)  # More text is on its way
+                check()
+                continue
+
+            result, key, ends_sentence = pending[0]
+            if isinstance(result, Future):
+                wav = wait(result)
+                if key is not None:
+                    AudioCache.put(key, pcm16_bytes(wav), 'pcm')
+            else:
+                wav = result
+            pending.popleft()
+            wav = wav.copy()
+
+            # Smooth the boundaries: crossfade where a sentence was split, otherwise short fades and a fixed pause
+            if tail is not None:
+                # Segments shorter than the crossfade only overlap as far as they reach
+                overlap = min(SEGMENT_CROSSFADE_SAMPLES, len(tail), len(wav))
+                crossfade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+                wav = np.concatenate([tail[:len(tail) - overlap], tail[len(tail) - overlap:] * crossfade_in[::-1] + wav[:overlap] * crossfade_in, wav[overlap:]])
+            elif len(wav) > 2 * SENTENCE_FADE_SAMPLES:
+                wav[:SENTENCE_FADE_SAMPLES] *= fade_in
+
+            if ends_sentence:
+                tail = None
+                if len(wav) > 2 * SENTENCE_FADE_SAMPLES:
+                    wav[-SENTENCE_FADE_SAMPLES:] *= fade_in[::-1]
+                audio_samples += len(wav)
+                yield np.concatenate([wav, np.zeros(SENTENCE_PAUSE_SAMPLES, dtype=np.float32)])
+            else:
+                keep = min(SEGMENT_CROSSFADE_SAMPLES, len(wav))
+                tail = wav[len(wav) - keep:].copy()
+                audio_samples += len(wav) - keep
+                if len(wav) > keep:
+                    yield wav[:len(wav) - keep]
+
+        # The wall time of incremental text includes waiting for the text, so no real-time factor for it
+        Metrics.record_synthesis(feed.characters, audio_samples / TTSManager.sample_rate, 0.0 if feed.incremental else time.perf_counter() - started)
+    finally:
+        feed.close()
+        # Stopped early (error, deadline or client gone): drop segments nobody will listen to
+        for result, _, _ in pending:
+            if isinstance(result, Future) and not result.cancel() and result.exception() is None:
+                InferenceScheduler.record_waste(result.inference_seconds, "discarded", Metrics.labels())
+
+
+def synthesize(text: str, language: str, speaker_wav: str, model_name: Optional[str] = None, priority: str = DEFAULT_PRIORITY,
+               deadline: Optional[float] = None, disconnected: Optional[Callable[[], bool]] = None) -> np.ndarray:
+    """Synthesize the whole text into one waveform"""
+    with Metrics.stage("synthesis"):
+        wavs = list(synthesize_segments(text, language, speaker_wav, model_name, priority, deadline, disconnected))
+    return np.concatenate(wavs) if wavs else np.zeros(0, dtype=np.float32)
+
+
+def wav_header(sample_rate: int, data_size: int = 0xFFFFFFFF - 36) -> bytes:
+    """16 bit mono PCM WAV header - the default size marks a stream of unknown length"""
+    return b''.join([
+        b'RIFF', struct.pack('<I', min(data_size + 36, 0xFFFFFFFF)), b'WAVE',
+        b'fmt ', struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16),
+        b'data', struct.pack('<I', data_size)
+    ])
+
+
+def pcm16_bytes(wav: np.ndarray) -> bytes:
+    """Float waveform to 16 bit little endian PCM"""
+    return (np.clip(wav, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+def normalize_peak(wav: np.ndarray) -> np.ndarray:
+    """Peak-normalize like TTS.save_wav"""
+    return wav * (1.0 / max(0.01, float(np.max(np.abs(wav))) if len(wav) else 0.0))
+
+
+def wav_bytes(wav: np.ndarray, sample_rate: int, peak_normalize: bool = True) -> bytes:
+    """Complete WAV file, peak-normalized like TTS.save_wav"""
+    pcm = pcm16_bytes(normalize_peak(wav) if peak_normalize else wav)
+    return wav_header(sample_rate, len(pcm)) + pcm
+
+
+# ##### Post-processing
+
+def parse_bool(value) -> bool:
+    return value is True or str(value).lower() in ("true", "1", "yes")
+
+
+class PostProcessing:
+    """Output options of a request, applied to the waveform before encoding - vectorized, a few ms per sentence"""
+    min_sample_rate, max_sample_rate = 8000, 48000
+    min_speed, max_speed = 0.25, 4.0  # Same range as the OpenAI API
+    silence_threshold_db = float(os.getenv("TRIM_SILENCE_DB", "-40"))  # Relative to the peak
+    silence_margin_seconds = 0.05  # Kept before and after the speech
+    loudness_target_db = float(os.getenv("LOUDNESS_TARGET_DB", "-20"))  # RMS of the speech (pauses excluded), dBFS
+    peak_limit = 10 ** (-1 / 20)  # Normalized audio never peaks above -1 dBFS
+
+    def __init__(self, sample_rate: Optional[int] = None, speed: float = 1.0, trim_silence: bool = False, normalize: bool = False):
+        self.sample_rate = sample_rate
+        self.speed = speed
+        self.trim_silence = trim_silence
+        self.normalize = normalize
+
+    @classmethod
+    def from_values(cls, values) -> "PostProcessing":
+        """Options from request parameters (JSON body or form) - raises InvalidParameterError"""
+        sample_rate = values.get('sample_rate')
+        if sample_rate in (None, ''):
+            sample_rate = None
+        else:
+            try:
+                sample_rate = int(sample_rate)
+            except (TypeError, ValueError):
+                sample_rate = 0
+            if not cls.min_sample_rate <= sample_rate <= cls.max_sample_rate:
+                raise InvalidParameterError('sample_rate', f'sample_rate must be an integer between {cls.min_sample_rate} and {cls.max_sample_rate}')
+        speed = values.get('speed')
+        try:
+            speed = 1.0 if speed in (None, '') else float(speed)
+        except (TypeError, ValueError):
+            speed = 0.0
+        if not cls.min_speed <= speed <= cls.max_speed:
+            raise InvalidParameterError('speed', f'speed must be a number between {cls.min_speed} and {cls.max_speed}')
+        if torchaudio_functional is None:
+            if sample_rate not in (None, TTSManager.sample_rate):
+                raise InvalidParameterError('sample_rate', 'sample_rate is not available: torchaudio is not installed')
+            if speed != 1.0:
+                raise InvalidParameterError('speed', 'speed is not available: torchaudio is not installed')
+        return cls(sample_rate, speed, parse_bool(values.get('trim_silence', False)), parse_bool(values.get('normalize', False)))
+
+    @property
+    def active(self) -> bool:
+        return self.sample_rate is not None or self.speed != 1.0 or self.trim_silence or self.normalize
+
+    def cache_key(self) -> str:
+        """Part of the audio cache key - empty without post-processing, so existing entries stay valid"""
+        if not self.active:
+            return ""
+        return f"rate={self.sample_rate},speed={self.speed:g},trim={int(self.trim_silence)},normalize={int(self.normalize)}"
+
+    def output_rate(self, sample_rate: int) -> int:
+        return self.sample_rate or sample_rate
+
+    def apply(self, wav: np.ndarray, sample_rate: int, trim_start: bool = True, trim_end: bool = True) -> np.ndarray:
+        """Trim, resample, change the speed and normalize - returns the waveform at output_rate()"""
+        if not self.active or len(wav) == 0:
+            return wav
+        with Metrics.stage("postprocess"):
+            if self.trim_silence and (trim_start or trim_end):
+                start, end = self._speech_bounds(wav, sample_rate)
+                wav = wav[start if trim_start else 0:end if trim_end else len(wav)]
+            if self.sample_rate is not None and self.sample_rate != sample_rate and len(wav):
+                wav = torchaudio_functional.resample(torch.from_numpy(np.ascontiguousarray(wav, dtype=np.float32)), sample_rate, self.sample_rate).numpy()
+            if self.speed != 1.0 and len(wav):
+                wav = self._change_speed(wav, self.output_rate(sample_rate))
+            if self.normalize and len(wav):
+                wav = self._normalize_loudness(wav, self.output_rate(sample_rate))
+        return wav
+
+    def stream(self, wavs, sample_rate: int):
+        """Apply to a stream of waveform chunks - trailing silence of a chunk is held back until more speech follows"""
+        if not self.active:
+            yield from wavs
+            return
+        held_back = None
+        first = True
+        for wav in wavs:
+            if self.trim_silence:
+                start, end = self._speech_bounds(wav, sample_rate)
+                if start >= end:
+                    continue  # Only silence
+                if held_back is not None:
+                    yield held_back
+                    held_back = None
+                if end < len(wav):
+                    # Sent as digital silence of the same (resampled, stretched) length
+                    held_back = np.zeros(int((len(wav) - end) * self.output_rate(sample_rate) / sample_rate / self.speed), dtype=np.float32)
+                wav = self.apply(wav[start if first else 0:end], sample_rate, trim_start=False, trim_end=False)
+            else:
+                wav = self.apply(wav, sample_rate)
+            first = False
+            yield wav
+
+    def _speech_bounds(self, wav: np.ndarray, sample_rate: int) -> tuple:
+        # Frame RMS against a threshold relative to the peak, plus a small margin
+        frame = max(1, sample_rate // 100)
+        frames = len(wav) // frame
+        if frames == 0:
+            return 0, len(wav)
+        rms = np.sqrt(np.mean(np.square(wav[:frames * frame].reshape(frames, frame)), axis=1))
+        voiced = np.flatnonzero(rms > np.max(np.abs(wav)) * 10 ** (self.silence_threshold_db / 20))
+        if len(voiced) == 0:
+            return 0, 0
+        margin = int(self.silence_margin_seconds * sample_rate)
+        return max(0, voiced[0] * frame - margin), min(len(wav), (voiced[-1] + 1) * frame + margin)
+
+    def _change_speed(self, wav: np.ndarray, sample_rate: int) -> np.ndarray:
+        # Phase vocoder time stretch: faster or slower speech at the same pitch
+        n_fft = 1 << max(8, math.ceil(math.log2(sample_rate * 0.02)))
+        hop = n_fft // 4
+        window = torch.hann_window(n_fft)
+        length = int(len(wav) / self.speed)
+        # stft needs a full frame - short stream chunks are stretched zero-padded and cut to length
+        signal = torch.zeros(max(len(wav), n_fft))
+        signal[:len(wav)] = torch.from_numpy(np.ascontiguousarray(wav, dtype=np.float32))
+        spec = torch.stft(signal, n_fft, hop, window=window, return_complex=True)
+        phase_advance = torch.linspace(0, math.pi * hop, n_fft // 2 + 1)[..., None]
+        spec = torchaudio_functional.phase_vocoder(spec, self.speed, phase_advance)
+        return torch.istft(spec, n_fft, hop, window=window, length=int(len(signal) / self.speed)).numpy()[:length]
+
+    def _normalize_loudness(self, wav: np.ndarray, sample_rate: int) -> np.ndarray:
+        # RMS of the voiced frames to the target level, limited so the peak stays below -1 dBFS
+        frame = max(1, sample_rate // 100)
+        frames = len(wav) // frame
+        peak = float(np.max(np.abs(wav)))
+        if frames == 0 or peak == 0.0:
+            return wav
+        rms = np.sqrt(np.mean(np.square(wav[:frames * frame].reshape(frames, frame)), axis=1))
+        voiced = rms[rms > peak * 10 ** (self.silence_threshold_db / 20)]
+        loudness = float(np.sqrt(np.mean(np.square(voiced)))) if len(voiced) else float(np.max(rms))
+        gain = min(10 ** (self.loudness_target_db / 20) / max(loudness, 1e-6), self.peak_limit / peak)
+        return wav * gain
+
+
+# Output formats of the OpenAI API: format -> (mimetype, ffmpeg output arguments or None if encoded in Python)
+AUDIO_FORMATS = {
+    "wav": ("audio/wav", None),
+    "pcm": ("audio/pcm", None),  # Raw 16 bit little endian mono samples at the output sample rate (24kHz by default)
+    "mp3": ("audio/mpeg", ["-f", "mp3", "-c:a", "libmp3lame", "-b:a", os.getenv("MP3_BITRATE", "64k")]),
+    "opus": ("audio/ogg", ["-f", "ogg", "-c:a", "libopus", "-b:a", os.getenv("OPUS_BITRATE", "32k")]),
+    "aac": ("audio/aac", ["-f", "adts", "-c:a", "aac", "-b:a", os.getenv("AAC_BITRATE", "64k")]),
+    "flac": ("audio/flac", ["-f", "flac", "-c:a", "flac"])
+}
+
+
+class AudioEncoder:
+    """Encodes waveforms into the output formats on a bounded worker pool, off the request and inference threads"""
+    workers = int(os.getenv("ENCODER_WORKERS", "2"))
+    ffmpeg = shutil.which(os.getenv("FFMPEG_PATH", "ffmpeg"))
+    stats = {}  # format -> {"count", "seconds", "bytes"}
+    _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="flextts-encoder")
+    _lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls, audio_format: str) -> bool:
+        return audio_format in AUDIO_FORMATS and (AUDIO_FORMATS[audio_format][1] is None or cls.ffmpeg is not None)
+
+    @classmethod
+    def _ffmpeg_command(cls, audio_format: str, sample_rate: int) -> List[str]:
+        return [cls.ffmpeg, "-hide_banner", "-loglevel", "error", "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0"] \
+            + AUDIO_FORMATS[audio_format][1] + ["pipe:1"]
+
+    @classmethod
+    def _encode(cls, wav: np.ndarray, sample_rate: int, audio_format: str, peak_normalize: bool = True) -> bytes:
+        if audio_format == "wav":
+            return wav_bytes(wav, sample_rate, peak_normalize)
+        pcm = pcm16_bytes(normalize_peak(wav) if peak_normalize else wav)
+        if audio_format == "pcm":
+            return pcm
+        result = subprocess.run(cls._ffmpeg_command(audio_format, sample_rate), input=pcm, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Encoding to {audio_format} failed: " + result.stderr.decode('utf-8', 'replace').strip())
+        return result.stdout
+
+    @classmethod
+    def encode(cls, wav: np.ndarray, sample_rate: int, audio_format: str, peak_normalize: bool = True):
+        """Encode on the pool and wait - returns (audio bytes, encoding seconds)"""
+        started = time.perf_counter()
+        data = cls._pool.submit(cls._encode, wav, sample_rate, audio_format, peak_normalize).result()
+        seconds = time.perf_counter() - started
+        Metrics.observe("flextts_stage_duration_seconds", seconds, stage="encode", **Metrics.labels())
+        with cls._lock:
+            entry = cls.stats.setdefault(audio_format, {"count": 0, "seconds": 0.0, "bytes": 0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["bytes"] += len(data)
+        if DEBUG:
+            log(f"Encoded {audio_format}: {len(data)} bytes in {seconds * 1000:.1f}ms")
+        return data, seconds
+
+    @staticmethod
+    def _peak_normalized(wavs):
+        # The peak of the whole waveform is not known yet - the running peak gives the same gain as normalize_peak
+        # as long as no later chunk is louder, and never clips
+        peak = 0.0
+        for wav in wavs:
+            if len(wav):
+                peak = max(peak, float(np.max(np.abs(wav))))
+            yield wav * (1.0 / max(0.01, peak))
+
+    @classmethod
+    def stream(cls, wavs, sample_rate: int, audio_format: str, peak_normalize: bool = True):
+        """Encode a stream of waveform chunks and yield encoded bytes as ffmpeg produces them"""
+        if peak_normalize:
+            wavs = cls._peak_normalized(wavs)
+        if audio_format == "wav":
+            yield wav_header(sample_rate)
+        if AUDIO_FORMATS[audio_format][1] is None:
+            for wav in wavs:
+                yield pcm16_bytes(wav)
+            return
+
+        process = subprocess.Popen(cls._ffmpeg_command(audio_format, sample_rate), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        def feed():
+            # Runs on its own thread - it waits for inference, so it must not occupy an encoder worker
+            try:
+                for wav in wavs:
+                    process.stdin.write(pcm16_bytes(wav))
+                    process.stdin.flush()
+            except Exception as e:
+                log("ERROR while streaming:", str(e))
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        feeder = threading.Thread(target=feed, name="flextts-stream-feeder", daemon=True)
+        feeder.start()
+        try:
+            while True:
+                chunk = process.stdout.read1(4096)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+    @classmethod
+    def get_stats(cls):
+        with cls._lock:
+            return {
+                "workers": cls.workers,
+                "ffmpeg": cls.ffmpeg is not None,
+                "formats": {name: dict(entry) for name, entry in cls.stats.items()}
+            }
+
+
+def add_audio_headers(response: Response, audio_bytes: bytes, encoding_seconds: float) -> Response:
+    """Report output size and encoding time of a response"""
+    response.headers['X-Audio-Size'] = str(len(audio_bytes))
+    response.headers['X-Encoding-Time-Ms'] = f"{encoding_seconds * 1000:.1f}"
+    return response
+
+
+def base64_json_response(response_data: dict, audio_bytes: bytes) -> Response:
+    """JSON response with base64 audio_data - spliced in as bytes instead of copying it through str and jsonify"""
+    body = json.dumps(response_data).encode('utf-8')
+    return Response(body[:-1] + b', "audio_data": "' + base64.b64encode(audio_bytes) + b'"}', mimetype='application/json')
+
+
+def stream_speech(text: Union[str, SegmentFeed], language: str, speaker_wav: str, audio_format: str = "wav", model_name: Optional[str] = None,
+                  options: Optional[PostProcessing] = None, priority: str = DEFAULT_PRIORITY, deadline: Optional[float] = None,
+                  disconnected: Optional[Callable[[], bool]] = None):
+    """Chunked audio stream - each sentence is encoded and sent as soon as it is synthesized"""
+    labels = Metrics.labels()
+    profile = Profiler.current()
+
+    def sentences():
+        # Runs on whichever thread consumes the stream, so the request's metrics labels and profile are carried over
+        Metrics.reset(**labels)
+        Profiler.bind(profile)
+        try:
+            yield from synthesize_segments(text, language, speaker_wav, model_name, priority, deadline, disconnected)
+        except (DeadlineExceededError, ClientDisconnectedError) as e:
+            log("Stream stopped:", str(e))
+        except Exception as e:
+            # Headers are already sent, so the stream just ends early
+            log("ERROR while streaming:", str(e))
+        finally:
+            Profiler.bind(None)
+            TTSManager.clear_cuda()
+
+    def audio():
+        # Post-processing and encoding also run while the response is sent - an error ends the stream the same way
+        try:
+            yield from AudioEncoder.stream(options.stream(sentences(), TTSManager.sample_rate), options.output_rate(TTSManager.sample_rate),
+                                           audio_format, not options.normalize)
+        except Exception as e:
+            log("ERROR while streaming:", str(e))
+
+    options = options or PostProcessing()
+    return audio()
+
+
+class AudioCache:
+    """Synthesized audio by (text, language, speaker, model, format) - byte-bounded LRU in memory plus a disk tier"""
+    enabled = os.getenv("AUDIO_CACHE", "true").lower() == "true"
+    memory_limit = int(float(os.getenv("AUDIO_CACHE_MEMORY_MB", "64")) * 1024 * 1024)
+    disk_limit = int(float(os.getenv("AUDIO_CACHE_DISK_MB", "1024")) * 1024 * 1024)
+    directory = os.path.join(static_audio_path, "cache")
+    stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+    _memory = OrderedDict()  # key -> bytes, least recently used first
+    _memory_bytes = 0
+    _disk = None  # key -> (filename, size), least recently used first - scanned on first use
+    _disk_bytes = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, language: str, speaker: str, model: str, audio_format: str, options: str = "") -> str:
+        """Content address of a synthesis result - options describe the post-processing, if any"""
+        normalized = re.sub(r'\s+', ' ', text).strip()
+        parts = [normalized, language, speaker, model, audio_format] + ([options] if options else [])
+        return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def _disk_index(cls):
+        # Called with the lock held
+        if cls._disk is None:
+            cls._disk = OrderedDict()
+            cls._disk_bytes = 0
+            if not os.path.exists(cls.directory):
+                os.makedirs(cls.directory)
+            entries = []
+            for filename in os.listdir(cls.directory):
+                filepath = os.path.join(cls.directory, filename)
+                if filename.startswith('.') or filename.endswith('.tmp') or not os.path.isfile(filepath):
+                    continue  # Hidden files and files that are still being written
+                entries.append((os.path.getmtime(filepath), filename, os.path.getsize(filepath)))
+            for _, filename, size in sorted(entries):
+                cls._disk[filename.split('.')[0]] = (filename, size)
+                cls._disk_bytes += size
+        return cls._disk
+
+    @classmethod
+    def get(cls, key: str) -> Optional[bytes]:
+        """Return cached audio bytes or None"""
+        if not cls.enabled:
+            return None
+        with cls._lock:
+            data = cls._memory.get(key)
+            if data is not None:
+                cls._memory.move_to_end(key)
+                cls.stats["memory_hits"] += 1
+                return data
+            entry = cls._disk_index().get(key) if cls.disk_limit > 0 else None
+
+        if entry is not None:
+            filepath = os.path.join(cls.directory, entry[0])
+            try:
+                with open(filepath, 'rb') as audio_file:
+                    data = audio_file.read()
+                os.utime(filepath)  # Keep recently used files on eviction
+            except OSError:
+                data = None
+            with cls._lock:
+                if data is None:
+                    cls._drop_disk(key)
+                else:
+                    if key in cls._disk:  # A concurrent put may have evicted it while the file was read
+                        cls._disk.move_to_end(key)
+                    cls.stats["disk_hits"] += 1
+                    cls._store_memory(key, data)
+                    return data
+
+        with cls._lock:
+            cls.stats["misses"] += 1
+        return None
+
+    @classmethod
+    def file_path(cls, key: str) -> Optional[str]:
+        """Path of the cached file in the disk tier, if there is one"""
+        if not cls.enabled or cls.disk_limit <= 0:
+            return None
+        with cls._lock:
+            entry = cls._disk_index().get(key)
+        if entry is None:
+            return None
+        return os.path.join(cls.directory, entry[0])
+
+    @classmethod
+    def put(cls, key: str, data: bytes, audio_format: str):
+        """Store audio bytes in both tiers"""
+        if not cls.enabled:
+            return
+        with cls._lock:
+            cls.stats["stores"] += 1
+            cls._store_memory(key, data)
+
+        if cls.disk_limit <= 0 or len(data) > cls.disk_limit:
+            return
+        filename = f"{key}.{audio_format}"
+        filepath = os.path.join(cls.directory, filename)
+        try:
+            with cls._lock:
+                cls._disk_index()
+            # Write atomically so concurrent readers never see partial files
+            temp_path = filepath + f".{uuid.uuid4().hex}.tmp"
+            with open(temp_path, 'wb') as audio_file:
+                audio_file.write(data)
+            os.replace(temp_path, filepath)
+        except OSError as e:
+            log(f"Error writing audio cache file {filepath}: {e}")
+            return
+
+        with cls._lock:
+            cls._drop_disk(key)
+            cls._disk[key] = (filename, len(data))
+            cls._disk_bytes += len(data)
+            while cls._disk_bytes > cls.disk_limit and len(cls._disk) > 1:
+                old_key = next(iter(cls._disk))
+                old_filename = cls._disk[old_key][0]
+                cls._drop_disk(old_key)
+                cls.stats["evictions"] += 1
+                try:
+                    os.remove(os.path.join(cls.directory, old_filename))
+                except OSError as e:
+                    log(f"Error removing cached audio {old_filename}: {e}")
+
+    @classmethod
+    def _store_memory(cls, key, data):
+        # Called with the lock held
+        if len(data) > cls.memory_limit:
+            return
+        if key in cls._memory:
+            cls._memory_bytes -= len(cls._memory.pop(key))
+        cls._memory[key] = data
+        cls._memory_bytes += len(data)
+        while cls._memory_bytes > cls.memory_limit:
+            _, old_data = cls._memory.popitem(last=False)
+            cls._memory_bytes -= len(old_data)
+            cls.stats["evictions"] += 1
+
+    @classmethod
+    def _drop_disk(cls, key):
+        # Called with the lock held
+        entry = cls._disk.pop(key, None)
+        if entry is not None:
+            cls._disk_bytes -= entry[1]
+
+    @classmethod
+    def get_stats(cls):
+        with cls._lock:
+            return {
+                **cls.stats,
+                "enabled": cls.enabled,
+                "memory_entries": len(cls._memory),
+                "memory_bytes": cls._memory_bytes,
+                "memory_limit_bytes": cls.memory_limit,
+                "disk_entries": len(cls._disk) if cls._disk is not None else 0,
+                "disk_bytes": cls._disk_bytes,
+                "disk_limit_bytes": cls.disk_limit
+            }
+
+
+# Initialize Flask app
+app = Flask(__name__, static_url_path='/static')
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+
+# Configure server name if running in Docker
+docker_port = os.getenv('DOCKER_PORT', '6969')  # Default to 6969 if not set
+
+# Replica processes re-import this module: they load their own model but never serve HTTP
+is_replica = multiprocessing.current_process().name.startswith("flextts-replica-")
+
+precompute_latents = os.getenv("PRECOMPUTE_SPEAKER_LATENTS", "false").lower() == "true"
+
+# Replica processes load their own model right away - the server loads it in the background (see ModelLoader)
+if is_replica:
+    TTSManager.get_model()
+    if precompute_latents:
+        log("Precomputing speaker latents...")
+        SpeakerLatentCache.precompute()
+
+
+def warm_up_jobs() -> List[tuple]:
+    """(text, language, speaker_wav) of the dummy syntheses that warm up a freshly loaded model"""
+    runs = int(os.getenv("WARMUP_RUNS", "2"))
+    languages = os.getenv("WARMUP_LANGUAGES", default["language"])
+    if languages == "all":
+        languages = list(SpeakerIndex.languages())
+    else:
+        languages = [language.strip() for language in languages.split(",") if language.strip()]
+
+    jobs = []
+    for language in languages:
+        speaker = default["speaker"] if language == default["language"] else SpeakerIndex.first_speaker(language)
+        if speaker is None:
+            log(f"Warm-up: no speaker for language {language}")
+            continue
+        speaker_wav = os.path.join(speaker_path, language, speaker + ".wav")
+        jobs += [(os.getenv("WARMUP_TEXT", "Hello, this is a short warm-up sentence."), language, speaker_wav)] * runs
+    return jobs
+
+
+class Autotuner:
+    """Benchmarks worker layouts on this host at startup and keeps the fastest one in data/autotune.json
+
+    Candidates use all available cores, split into 1, 2, 4... replicas of the model (up to AUTOTUNE_MAX_REPLICAS,
+    or only REPLICAS if that is set), each with all or half of its cores as torch threads. The best layout is then
+    tried with a single inter-op thread. Each candidate runs in fresh replica processes that synthesize
+    AUTOTUNE_TEXT on all replicas at once. The result is reused on later boots until the hardware, the model,
+    the library versions or the tuning settings change.
+    """
+    mode = os.getenv("AUTOTUNE", "false").lower()  # true, false or force (measure again)
+    goal = os.getenv("AUTOTUNE_GOAL", "throughput")  # throughput: audio seconds per second of all replicas, latency: of one
+    max_replicas = int(os.getenv("AUTOTUNE_MAX_REPLICAS", "4"))
+    runs = int(os.getenv("AUTOTUNE_RUNS", "2"))
+    text = os.getenv("AUTOTUNE_TEXT", "Good morning! The weather today is mostly sunny with a light breeze from the west. "
+                                      "In the afternoon, temperatures will rise to twenty three degrees, so do not forget to open the windows.")
+    file_path = os.path.join(app_path, "data", "autotune.json")
+    state = "disabled"  # measuring -> tuned, loaded (from a previous boot), skipped or failed
+    error = None
+    settings = None  # Applied {"replicas", "threads", "interop_threads", "rtf", "throughput"}
+    results = []  # Measured candidates
+    tuned_at = None
+    if mode not in ("true", "false", "force") or goal not in ("throughput", "latency"):
+        raise ValueError("Fatal Error: AUTOTUNE must be true, false or force and AUTOTUNE_GOAL throughput or latency", mode, goal)
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls.mode in ("true", "force")
+
+    @classmethod
+    def fingerprint(cls) -> dict:
+        """Everything that invalidates a previous result"""
+        return {
+            "cpu": cpu_model(),
+            "cpus": len(InferenceScheduler.cpu_ids()),
+            "model": TTSManager.model_name,
+            "cpu_precision": TTSManager.cpu_precision,
+            "tts": package_version("TTS"),
+            "torch": torch.__version__,
+            "goal": cls.goal,
+            "replicas": os.getenv("REPLICAS"),
+            "max_replicas": cls.max_replicas,
+            "pin_cpus": InferenceScheduler.pin_cpus,
+            "text": cls.text
+        }
+
+    @classmethod
+    def run(cls):
+        """Apply the stored settings for this host, or measure them first - called by the model loader"""
+        if torch.cuda.is_available():
+            cls.state = "skipped"
+            log("Autotune: not needed with CUDA")
+            return
+        fingerprint = cls.fingerprint()
+        stored = cls._load()
+        if cls.mode != "force" and stored is not None and stored.get("fingerprint") == fingerprint:
+            cls.results, cls.tuned_at = stored["results"], stored["tuned_at"]
+            cls.state = "loaded"
+        else:
+            cls.state = "measuring"
+            cls._measure_all()
+            if not any("error" not in result for result in cls.results):
+                cls.state = "failed"
+                cls.error = "No candidate could be measured"
+                log("Autotune: failed, keeping the configured settings")
+                return
+            cls.tuned_at = datetime.now().isoformat(timespec="seconds")
+            cls.state = "tuned"
+            cls._save(fingerprint)
+        cls._apply(max((result for result in cls.results if "error" not in result), key=cls._score))
+
+    @classmethod
+    def _score(cls, result: dict) -> float:
+        return result["rtf"] if cls.goal == "latency" else result["throughput"]
+
+    @classmethod
+    def _measure_all(cls):
+        cls.results = []
+        cores = len(InferenceScheduler.cpu_ids())
+        if os.getenv("REPLICAS"):
+            replica_options = [max(1, InferenceScheduler.replica_count)]
+        else:
+            replica_options = [count for count in (2 ** power for power in range(8)) if count <= min(cls.max_replicas, cores)]
+        candidates = []
+        for replicas in replica_options:
+            threads = max(1, cores // replicas)
+            candidates += [(replicas, threads, 0)] + ([(replicas, threads // 2, 0)] if threads > 1 else [])
+        log(f"Autotune: measuring {len(candidates) + 1} worker layouts on {cores} cores...")
+        for candidate in candidates:
+            cls._measure(*candidate)
+        measured = [result for result in cls.results if "error" not in result]
+        if measured:
+            best = max(measured, key=cls._score)
+            cls._measure(best["replicas"], best["threads"], 1)
+
+    @classmethod
+    def _measure(cls, replicas: int, threads: int, interop_threads: int):
+        """Synthesize the text on all replicas of one layout at once"""
+        result = {"replicas": replicas, "threads": threads, "interop_threads": interop_threads}
+        language = default["language"]
+        speaker_wav = os.path.join(speaker_path, language, default["speaker"] + ".wav")
+        sentences = split_sentences(cls.text, language)
+        pool = InferenceScheduler.create_replicas(replicas, threads, interop_threads)
+
+        def synthesize_all(replica: ModelReplica) -> tuple:
+            audio_seconds = wall_seconds = 0.0
+            for _ in range(cls.runs):
+                for sentence in sentences:
+                    started = time.perf_counter()
+                    wav, _ = replica.synthesize(sentence, language, speaker_wav)
+                    wall_seconds += time.perf_counter() - started
+                    audio_seconds += len(wav) / TTSManager.sample_rate
+            return audio_seconds, wall_seconds
+
+        try:
+            with ThreadPoolExecutor(replicas) as executor:
+                # Replicas warm up before they report ready
+                list(executor.map(ModelReplica.start, pool))
+                started = time.perf_counter()
+                measured = list(executor.map(synthesize_all, pool))
+                elapsed = time.perf_counter() - started
+            result["rtf"] = sum(audio / wall for audio, wall in measured) / replicas
+            result["throughput"] = sum(audio for audio, _ in measured) / elapsed
+            result["seconds"] = elapsed
+            log(f"Autotune: {replicas} replicas x {threads} threads" + (f", {interop_threads} inter-op" if interop_threads else "") +
+                f": real-time factor {result['rtf']:.2f}, {result['throughput']:.2f} audio seconds per second")
+        except Exception as e:
+            result["error"] = str(e)
+            log(f"Autotune: {replicas} replicas x {threads} threads failed: {e}")
+        finally:
+            for replica in pool:
+                replica.stop()
+        cls.results.append(result)
+
+    @classmethod
+    def _apply(cls, best: dict):
+        if not os.getenv("REPLICAS"):
+            # A single replica is the same as running the model in the server process, without the pipe in between
+            InferenceScheduler.replica_count = best["replicas"] if best["replicas"] > 1 else 0
+        InferenceScheduler.threads = best["threads"]
+        InferenceScheduler.interop_threads = best["interop_threads"]
+        cls.settings = {key: best[key] for key in ("replicas", "threads", "interop_threads", "rtf", "throughput")}
+        log(f"Autotune: using {best['replicas']} replicas x {best['threads']} threads" +
+            (f", {best['interop_threads']} inter-op threads" if best["interop_threads"] else "") + f" ({cls.state})")
+
+    @classmethod
+    def _load(cls) -> Optional[dict]:
+        try:
+            with open(cls.file_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def _save(cls, fingerprint: dict):
+        try:
+            temp_path = cls.file_path + ".tmp"
+            with open(temp_path, "w") as file:
+                json.dump({"fingerprint": fingerprint, "tuned_at": cls.tuned_at, "results": cls.results}, file, indent=2)
+            os.replace(temp_path, cls.file_path)
+        except OSError as e:
+            log(f"Error saving {cls.file_path}: {e}")
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            "state": cls.state,
+            "error": cls.error,
+            "goal": cls.goal,
+            "tuned_at": cls.tuned_at,
+            "settings": cls.settings,
+            "results": cls.results
+        }
+
+
+class ModelLoader:
+    """Loads and warms up the model in the background while the server already answers - synthesis gets 503 until ready"""
+    retry_after = 5
+    state = "starting"  # autotuning -> loading -> warming_up -> ready, or failed
+    error = None
+    stats = {"autotune_seconds": None, "load_seconds": None, "warmup_seconds": None, "warmup_runs": 0, "ready_after_seconds": None}
+    _created = time.monotonic()
+    _ready = threading.Event()
+    _thread = None
+
+    @classmethod
+    def start(cls):
+        """Start loading (idempotent)"""
+        if cls._thread is None:
+            cls._thread = threading.Thread(target=cls._run, name="flextts-model-loader", daemon=True)
+            cls._thread.start()
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        return cls._ready.is_set()
+
+    @classmethod
+    def wait(cls, timeout: Optional[float] = None) -> bool:
+        return cls._ready.wait(timeout)
+
+    @classmethod
+    def _run(cls):
+        try:
+            if Autotuner.enabled():
+                cls.state = "autotuning"
+                started = time.monotonic()
+                Autotuner.run()
+                cls.stats["autotune_seconds"] = time.monotonic() - started
+            cls.state = "loading"
+            started = time.monotonic()
+            # From here on only the scheduler's worker thread (or the replica processes) run inference
+            InferenceScheduler.start()
+            if InferenceScheduler.replica_count == 0:
+                set_torch_threads(InferenceScheduler.threads, InferenceScheduler.interop_threads)
+                log("Loading TTS model in the background...")
+                TTSManager.get_model()
+                if precompute_latents:
+                    log("Precomputing speaker latents...")
+                    SpeakerLatentCache.precompute()
+            else:
+                # Replicas load and warm up in their own processes
+                while not all(replica.ready for replica in InferenceScheduler._replicas):
+                    time.sleep(0.5)
+            cls.stats["load_seconds"] = time.monotonic() - started
+
+            if InferenceScheduler.replica_count == 0:
+                cls.state = "warming_up"
+                started = time.monotonic()
+                futures = [InferenceScheduler.submit(*job, admitted=True, coalesce=False) for job in warm_up_jobs()]
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        log("Warm-up failed:", str(e))
+                cls.stats["warmup_runs"] = len(futures)
+                cls.stats["warmup_seconds"] = time.monotonic() - started
+
+            cls.stats["ready_after_seconds"] = time.monotonic() - cls._created
+            cls.state = "ready"
+            cls._ready.set()
+            log(f"Model ready after {cls.stats['ready_after_seconds']:.1f}s")
+        except Exception as e:
+            cls.state = "failed"
+            cls.error = str(e)
+            log("ERROR loading the model:", str(e))
+
+    @classmethod
+    def get_stats(cls):
+        return {"state": cls.state, "ready": cls.is_ready(), "error": cls.error, **cls.stats}
+
+# ##### Helper functions
+
+def resolve_speaker(language: str, speaker: str) -> str:
+    """Path of the speaker WAV - raises InvalidParameterError for invalid or unknown speakers"""
+    # speaker_regex test: only letters, underscores and dashes and numbers allowed!
+    if not re.match("^[a-zA-Z0-9_\-]+$", speaker):
+        log("ERROR - Invalid speaker name: " + speaker)
+        raise InvalidParameterError('speaker', 'Invalid speaker name')
+
+    speaker_wav = os.path.join(speaker_path, language, speaker + ".wav")
+    if not SpeakerIndex.has_speaker(language, speaker):
+        log("ERROR - Speaker not found: " + speaker + " (language: " + language + ") - " + speaker_wav)
+        raise InvalidParameterError('speaker', 'Speaker not found: ' + speaker + ' (language: ' + language + ')')
+    return speaker_wav
+
+
+def request_scheduling(values) -> tuple:
+    """(priority lane, deadline) of the current request from the X-Priority / X-Deadline-Ms headers or the
+    priority / deadline_ms parameters - raises InvalidParameterError"""
+    priority = request.headers.get('X-Priority') or values.get('priority') or DEFAULT_PRIORITY
+    if priority not in PRIORITY_LANES:
+        raise InvalidParameterError('priority', 'priority must be one of: ' + ', '.join(f'"{lane}"' for lane in PRIORITY_LANES))
+    deadline_ms = request.headers.get('X-Deadline-Ms') or values.get('deadline_ms')
+    if deadline_ms in (None, ''):
+        return priority, None
+    try:
+        deadline_ms = float(deadline_ms)
+    except (TypeError, ValueError):
+        deadline_ms = 0.0
+    if deadline_ms <= 0:
+        raise InvalidParameterError('deadline_ms', 'deadline_ms must be a positive number of milliseconds')
+    return priority, time.monotonic() + deadline_ms / 1000
+
+
+def disconnect_probe() -> Callable[[], bool]:
+    """Check for the client of the current request having closed its connection
+
+    Needs the socket of the connection, which the Flask development server (werkzeug) and gunicorn expose,
+    or the disconnect event that asgi.py puts into the ASGI scope.
+    """
+    event = request.environ.get('asgi.scope', {}).get('flextts.disconnected')
+    if event is not None:
+        return event.is_set
+    connection = request.environ.get('werkzeug.socket') or request.environ.get('gunicorn.socket')
+    if connection is None:
+        return lambda: False
+
+    def disconnected() -> bool:
+        try:
+            readable, _, _ = select.select([connection], [], [], 0)
+            # Readable without data means the client sent FIN
+            return bool(readable) and connection.recv(1, socket.MSG_PEEK) == b''
+        except ValueError:
+            return False  # TLS sockets cannot peek - unknown, so still connected
+        except OSError:
+            return True
+
+    return disconnected
+
+
+def clean_text_for_tts(text: str) -> str:
+    try:
+        """Clean text for TTS synthesis"""
+        # Remove unwanted characters - list: 
+        # Remove all non-alphanumeric characters except spaces, periods, commas, exclamation marks, question marks, single quotes, double quotes and dashes
+        text = re.sub(r'[^a-zA-Z0-9\s.,!?\'\"-]', '', text)
+        # Remove any "*" characters
+        text = re.sub(r'\*', '', text)
+        
+        # Replace multiple spaces with a single space
+        text = re.sub(r'\s+', ' ', text)
+        return text.strip()
+    except Exception as e:
+        log("Error cleaning text for TTS:", e)
+        return text
+
+class SpeakerIndex:
+    """In-memory catalog of data/speakers - rebuilt when a speaker directory changes, never scanned on the request path"""
+    refresh_interval = float(os.getenv("SPEAKER_INDEX_REFRESH", "5"))
+    _languages = {}  # language -> sorted speaker display names (only languages with speakers)
+    _language_dirs = {}  # every language directory -> sorted speaker display names
+    _speakers = frozenset()  # (language, speaker file name)
+    _payloads = {}  # payload name -> (JSON body, ETag)
+    _mtimes = None
+    _lock = threading.Lock()
+    _thread = None
+
+    @classmethod
+    def _directory_mtimes(cls):
+        mtimes = {speaker_path: os.stat(speaker_path).st_mtime_ns}
+        for entry in os.scandir(speaker_path):
+            if entry.is_dir():
+                mtimes[entry.path] = entry.stat().st_mtime_ns
+        return mtimes
+
+    @classmethod
+    def refresh(cls, force: bool = False) -> bool:
+        """Rebuild the index if a speaker directory changed - returns True if it was rebuilt"""
+        with cls._lock:
+            mtimes = cls._directory_mtimes()
+            if not force and mtimes == cls._mtimes:
+                return False
+
+            language_dirs = {}
+            speakers = set()
+            for language in os.listdir(speaker_path):
+                language_path = os.path.join(speaker_path, language)
+                if os.path.isdir(language_path):
+                    names = []
+                    for file in os.listdir(language_path):
+                        if file.endswith('.wav'):
+                            speakers.add((language, file[:-4]))
+                            speaker_name = file[:-4].replace('_', ' ')  # Remove .wav and format
+                            speaker_name = ' '.join(word.capitalize() for word in speaker_name.split())
+                            names.append(speaker_name)
+                    language_dirs[language] = sorted(names)
+            languages = {language: names for language, names in language_dirs.items() if names}
+
+            # Precompute the JSON responses of the catalog endpoints
+            payloads = {"speakers": languages, "voices": {"voices": build_voice_list(languages)}}
+            for language, names in language_dirs.items():
+                payloads["speakers/" + language] = {'language': language, 'speakers': names}
+            for name, data in payloads.items():
+                body = (app.json.dumps(data) + "\n").encode('utf-8')
+                payloads[name] = (body, hashlib.sha1(body).hexdigest())
+
+            cls._languages, cls._language_dirs, cls._speakers, cls._payloads = languages, language_dirs, frozenset(speakers), payloads
+            cls._mtimes = mtimes
+        if DEBUG:
+            log(f"Speaker index rebuilt: {len(speakers)} speakers in {len(languages)} languages")
+        return True
+
+    @classmethod
+    def start(cls):
+        """Build the index and watch the speaker directories for changes"""
+        cls.refresh(force=True)
+        if cls.refresh_interval > 0 and cls._thread is None:
+            cls._thread = threading.Thread(target=cls._watch, name="flextts-speaker-index", daemon=True)
+            cls._thread.start()
+
+    @classmethod
+    def _watch(cls):
+        while True:
+            time.sleep(cls.refresh_interval)
+            try:
+                cls.refresh()
+            except Exception as e:
+                log("Error refreshing speaker index:", e)
+
+    @classmethod
+    def _ensure(cls):
+        if cls._mtimes is None:
+            cls.refresh(force=True)
+
+    @classmethod
+    def languages(cls) -> Dict[str, List[str]]:
+        cls._ensure()
+        return cls._languages
+
+    @classmethod
+    def language_dirs(cls) -> List[str]:
+        cls._ensure()
+        return list(cls._language_dirs)
+
+    @classmethod
+    def has_speaker(cls, language: str, speaker: str) -> bool:
+        cls._ensure()
+        return (language, speaker) in cls._speakers
+
+    @classmethod
+    def first_speaker(cls, language: str) -> Optional[str]:
+        """File name of the alphabetically first speaker of a language"""
+        cls._ensure()
+        return min((speaker for speaker_language, speaker in cls._speakers if speaker_language == language), default=None)
+
+    @classmethod
+    def payload(cls, name: str):
+        """Precomputed (JSON body, ETag) for a catalog endpoint, or None"""
+        cls._ensure()
+        return cls._payloads.get(name)
+
+
+def get_languages_data():
+    """Get all available languages and their speakers"""
+    return SpeakerIndex.languages()
+
+
+def build_voice_list(languages: Dict[str, List[str]]) -> List[dict]:
+    """OpenAI voices followed by all speakers as additional voices"""
+    voices = []
+    
+    # Add standard OpenAI voice mappings
+    for voice_id in OPENAI_VOICE_MAPPING.keys():
+        voices.append({
+            "voice_id": voice_id,
+            "name": voice_id.capitalize()
+        })
+    
+    # Add all speakers as additional voices
+    for language, speakers in languages.items():
+        for speaker in speakers:
+            speaker_id = speaker.lower().replace(' ', '_')
+            # Avoid duplicates with OpenAI voices
+            if speaker_id not in [v[1] for v in OPENAI_VOICE_MAPPING.values()]:
+                voices.append({
+                    "voice_id": f"{language}_{speaker_id}",
+                    "name": f"{language.capitalize()} - {speaker}"
+                })
+    return voices
+
 
-def log(*args):
-    if args:
-        print(" > [" + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "] " + " ".join(str(arg) for arg in args))
+def catalog_response(name: str) -> Response:
+    """Serve a precomputed catalog payload with ETag / If-None-Match support"""
+    body, etag = SpeakerIndex.payload(name)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
-log("Loading FlexTTS")
+class AudioJanitor:
+    """Deletes generated audio files on schedule - tracked in an expiry heap, no directory scans on the request path"""
+    max_age = float(os.getenv("AUDIO_MAX_AGE_HOURS", "1")) * 3600
+    max_bytes = int(float(os.getenv("AUDIO_MAX_MB", "512")) * 1024 * 1024)
+    stats = {"tracked": 0, "deleted": 0, "expired": 0, "over_quota": 0, "reclaimed_bytes": 0, "errors": 0}
+    _heap = []  # (expires_at, path, size), soonest first
+    _bytes = 0
+    _cond = threading.Condition()
+    _thread = None
 
-app_path = os.getenv("APP_PATH", os.getcwd())  # Use APP_PATH if set, otherwise getcwd
-speaker_path = os.path.join(app_path, "data", "speakers")
-static_audio_path = os.path.join(app_path, "static", "audio")
+    @classmethod
+    def track(cls, path: str, size: int, created_at: Optional[float] = None):
+        """Register a generated file for deletion after max_age"""
+        with cls._cond:
+            heapq.heappush(cls._heap, ((created_at or time.time()) + cls.max_age, path, size))
+            cls._bytes += size
+            cls.stats["tracked"] += 1
+            cls._cond.notify()
 
-if not os.path.exists(speaker_path):
-    os.makedirs(speaker_path)
+    @classmethod
+    def start(cls):
+        """Pick up files left over from a previous run and start the janitor thread"""
+        for entry in os.scandir(static_audio_path):
+            # The audio cache in static/audio/cache manages its own size
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                cls.track(entry.path, stat.st_size, stat.st_mtime)
+        if cls._thread is None:
+            cls._thread = threading.Thread(target=cls._loop, name="flextts-janitor", daemon=True)
+            cls._thread.start()
 
-if not os.path.exists(static_audio_path):
-    os.makedirs(static_audio_path)
+    @classmethod
+    def _loop(cls):
+        while True:
+            with cls._cond:
+                # Sleep until the next file expires, or a new file pushes us over the quota
+                while cls._heap and cls._heap[0][0] > time.time() and cls._bytes <= cls.max_bytes:
+                    cls._cond.wait(cls._heap[0][0] - time.time())
+                while not cls._heap:
+                    cls._cond.wait()
+                due = []
+                while cls._heap and (cls._heap[0][0] <= time.time() or cls._bytes > cls.max_bytes):
+                    expires_at, path, size = heapq.heappop(cls._heap)
+                    cls._bytes -= size
+                    due.append((path, size, expires_at <= time.time()))
 
-# Check if DEFAULT_LANGUAGE and DEFAULT_SPEAKER are set and valid
+            for path, size, expired in due:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    log(f"Error removing old file {path}: {e}")
+                    with cls._cond:
+                        cls.stats["errors"] += 1
+                    continue
+                with cls._cond:
+                    cls.stats["deleted"] += 1
+                    cls.stats["expired" if expired else "over_quota"] += 1
+                    cls.stats["reclaimed_bytes"] += size
+            if due and DEBUG:
+                log(f"Janitor removed {len(due)} audio files")
 
-default = {
-    "language": os.getenv("DEFAULT_LANGUAGE"),
-    "speaker": os.getenv("DEFAULT_SPEAKER").lower().replace(" ", "_")
-}
+    @classmethod
+    def get_stats(cls):
+        with cls._cond:
+            return {
+                **cls.stats,
+                "files": len(cls._heap),
+                "bytes": cls._bytes,
+                "max_bytes": cls.max_bytes,
+                "max_age_hours": cls.max_age / 3600,
+                "next_expiry_seconds": max(0.0, cls._heap[0][0] - time.time()) if cls._heap else None
+            }
 
-if not default["language"] or not default["speaker"]:
-    raise ValueError("Fatal Error: DEFAULT_LANGUAGE and DEFAULT_SPEAKER environment variables must be set")
 
-if not os.path.exists(os.path.join(speaker_path, default["language"])):
-    raise ValueError("Fatal Error: DEFAULT_LANGUAGE has no speaker files")
-    
-if not os.path.exists(os.path.join(speaker_path, default["language"], default["speaker"] + ".wav")):
-    raise ValueError("Fatal Error: DEFAULT_SPEAKER does not exist", os.path.join(speaker_path, default["language"], default["speaker"] + ".wav"))
+# ##### Batch jobs
 
+class BatchJobs:
+    """Bulk synthesis jobs - persisted in data/jobs, synthesized at background priority, resumed after a restart"""
+    max_items = int(os.getenv("BATCH_JOB_MAX_ITEMS", "10000"))
+    parallel = int(os.getenv("BATCH_JOB_PARALLEL", "0")) or InferenceScheduler.max_batch
+    max_age = float(os.getenv("BATCH_JOB_MAX_AGE_HOURS", "168")) * 3600
+    stats = {"created": 0, "resumed": 0, "completed": 0, "deleted": 0, "items_done": 0, "items_failed": 0}
+    _jobs = {}  # job id -> job (items and results as in job.json / results.jsonl)
+    _pending = deque()
+    _cond = threading.Condition()
+    _thread = None
 
-# Initialize TTS model
-os.environ['TTS_HOME'] = os.path.join(app_path, "data") # Save to permanent storage (for Docker)
-os.environ['COQUI_TOS_AGREED'] = "1" # Required for uninterrupted TTS Model Download
+    @staticmethod
+    def _dir(job_id: str) -> str:
+        return os.path.join(jobs_path, job_id)
 
-class TTSManager:
-    _instance = None
-    _model = None
+    @classmethod
+    def create(cls, items: List[dict], audio_format: str) -> dict:
+        """Persist a new job and queue it"""
+        job = {"id": uuid.uuid4().hex, "format": audio_format, "created": time.time(), "items": items}
+        os.makedirs(cls._dir(job["id"]))
+        with open(os.path.join(cls._dir(job["id"]), "job.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(os.path.join(cls._dir(job["id"]), "job.json.tmp"), os.path.join(cls._dir(job["id"]), "job.json"))
+        job.update(results={}, status="queued", finished=None)
+        with cls._cond:
+            cls._jobs[job["id"]] = job
+            cls._pending.append(job["id"])
+            cls.stats["created"] += 1
+            cls._cond.notify()
+        return job
 
     @classmethod
-    def get_model(cls):
-        if cls._model is None:
-            log("Loading TTS model...")
-            if torch.cuda.is_available():
-                # Clear CUDA cache before loading model
-                torch.cuda.empty_cache()
-                # Set memory usage limits for CUDA
-                torch.cuda.set_per_process_memory_fraction(0.8)  # Use up to 80% of available VRAM
-            cls._model = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", gpu=torch.cuda.is_available())
-        return cls._model
+    def get(cls, job_id: str) -> Optional[dict]:
+        with cls._cond:
+            return cls._jobs.get(job_id)
 
     @classmethod
-    def clear_cuda(cls):
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+    def list_jobs(cls) -> List[dict]:
+        with cls._cond:
+            return sorted(cls._jobs.values(), key=lambda job: job["created"])
 
-# Initialize Flask app
-app = Flask(__name__, static_url_path='/static')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    @classmethod
+    def summary(cls, job: dict) -> dict:
+        with cls._cond:
+            failed = sum(1 for result in job["results"].values() if "error" in result)
+            done = len(job["results"])
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "format": job["format"],
+            "created": datetime.fromtimestamp(job["created"]).isoformat(),
+            "finished": datetime.fromtimestamp(job["finished"]).isoformat() if job["finished"] else None,
+            "total": len(job["items"]),
+            "done": done - failed,
+            "failed": failed,
+            "progress": done / len(job["items"])
+        }
 
-# Configure server name if running in Docker
-docker_port = os.getenv('DOCKER_PORT', '6969')  # Default to 6969 if not set
+    @classmethod
+    def manifest(cls, job: dict, url=None) -> List[dict]:
+        """Per item: the request, plus the file name (and URL) or the error"""
+        with cls._cond:
+            results = dict(job["results"])
+        entries = []
+        for index, item in enumerate(job["items"]):
+            entry = {"index": index, **item, **{k: v for k, v in results.get(index, {}).items() if k != "index"}}
+            if index not in results:
+                entry["status"] = "pending"
+            elif url is not None and "file" in entry:
+                entry["url"] = url(index)
+            entries.append(entry)
+        return entries
 
-# Initialize TTS model at startup
-log("Loading TTS model at startup...")
-TTSManager.get_model()
+    @classmethod
+    def item_path(cls, job: dict, index: int) -> Optional[str]:
+        with cls._cond:
+            result = job["results"].get(index)
+        if result is None or "file" not in result:
+            return None
+        return os.path.join(cls._dir(job["id"]), result["file"])
 
-# ##### Helper functions
+    @classmethod
+    def archive_path(cls, job: dict) -> Optional[str]:
+        return os.path.join(cls._dir(job["id"]), "archive.zip") if job["status"] == "completed" else None
 
-def clean_text_for_tts(text: str) -> str:
-    try:
-        """Clean text for TTS synthesis"""
-        # Remove unwanted characters - list: 
-        # Remove all non-alphanumeric characters except spaces, periods, commas, exclamation marks, question marks, single quotes, double quotes and dashes
-        text = re.sub(r'[^a-zA-Z0-9\s.,!?\'\"-]', '', text)
-        # Remove any "*" characters
-        text = re.sub(r'\*', '', text)
-        
-        # Replace multiple spaces with a single space
-        text = re.sub(r'\s+', ' ', text)
-        return text.strip()
-    except Exception as e:
-        log("Error cleaning text for TTS:", e)
-        return text
+    @classmethod
+    def delete(cls, job_id: str) -> bool:
+        """Cancel the job if it is still running and remove its files"""
+        with cls._cond:
+            job = cls._jobs.pop(job_id, None)
+            if job is None:
+                return False
+            job["status"] = "deleted"
+            cls.stats["deleted"] += 1
+        shutil.rmtree(cls._dir(job_id), ignore_errors=True)
+        return True
 
-def get_languages_data():
-    """Get all available languages and their speakers"""
-    languages = {}
-    if os.path.exists(speaker_path):
-        for language in os.listdir(speaker_path):
-            language_path = os.path.join(speaker_path, language)
-            if os.path.isdir(language_path):
-                speakers = []
-                for file in os.listdir(language_path):
-                    if file.endswith('.wav'):
-                        speaker_name = file[:-4].replace('_', ' ')  # Remove .wav and format
-                        speaker_name = ' '.join(word.capitalize() for word in speaker_name.split())
-                        speakers.append(speaker_name)
-                if speakers:
-                    languages[language] = sorted(speakers)
-    return languages
-
-def cleanup_old_files(directory, max_age_hours=1):
-    """Clean up files older than max_age_hours"""
-    now = datetime.now()
-    for filename in os.listdir(directory):
-        if filename == '.gitkeep':
-            continue
-        filepath = os.path.join(directory, filename)
-        file_modified = datetime.fromtimestamp(os.path.getmtime(filepath))
-        if now - file_modified > timedelta(hours=max_age_hours):
+    @classmethod
+    def start(cls):
+        """Load the jobs of a previous run, queue the unfinished ones and start the runner thread"""
+        os.makedirs(jobs_path, exist_ok=True)
+        jobs = []
+        for entry in os.scandir(jobs_path):
+            try:
+                with open(os.path.join(entry.path, "job.json"), encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue  # Not created completely
+            job.update(results={}, status="queued", finished=None)
+            results_file = os.path.join(entry.path, "results.jsonl")
+            if os.path.exists(results_file):
+                with open(results_file, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # Torn write of the last line
+                        if "finished" in record:
+                            job.update(status="completed", finished=record["finished"])
+                        else:
+                            job["results"][record["index"]] = record
+            jobs.append(job)
+        with cls._cond:
+            for job in sorted(jobs, key=lambda job: job["created"]):
+                if job["id"] in cls._jobs:
+                    continue  # Already known - start() is idempotent
+                cls._jobs[job["id"]] = job
+                if job["status"] == "queued":
+                    cls._pending.append(job["id"])
+                    cls.stats["resumed"] += 1
+            cls._cond.notify()
+        if cls.stats["resumed"]:
+            log(f"Resuming {cls.stats['resumed']} batch jobs")
+        if cls._thread is None:
+            cls._thread = threading.Thread(target=cls._loop, name="flextts-batch-jobs", daemon=True)
+            cls._thread.start()
+
+    @classmethod
+    def _loop(cls):
+        ModelLoader.wait()
+        while True:
+            cls._expire()
+            with cls._cond:
+                if not cls._pending:
+                    cls._cond.wait(3600)
+                    continue
+                job = cls._jobs.get(cls._pending.popleft())
+                if job is None:
+                    continue  # Deleted while queued
+                job["status"] = "running"
             try:
-                os.remove(filepath)
+                cls._run_job(job)
             except Exception as e:
-                log(f"Error removing old file {filepath}: {e}")
+                log(f"ERROR in batch job {job['id']}:", str(e))
+
+    @classmethod
+    def _expire(cls):
+        with cls._cond:
+            expired = [job_id for job_id, job in cls._jobs.items() if job["finished"] and job["finished"] + cls.max_age < time.time()]
+        for job_id in expired:
+            cls.delete(job_id)
+
+    @classmethod
+    def _run_job(cls, job: dict):
+        # Grouped by voice, so the scheduler can batch neighbouring items and the speaker latents stay cached
+        items = job["items"]
+        todo = sorted((index for index in range(len(items)) if index not in job["results"]),
+                      key=lambda index: (items[index]["language"], items[index]["speaker"], index))
+        with ThreadPoolExecutor(cls.parallel, thread_name_prefix="flextts-job") as executor:
+            list(executor.map(lambda index: cls._run_item(job, index), todo))
+        if job["status"] == "deleted":
+            return
+
+        # Archive with the audio files and the manifest, built once
+        archive_file = os.path.join(cls._dir(job["id"]), "archive.zip")
+        with zipfile.ZipFile(archive_file + ".tmp", "w", zipfile.ZIP_STORED) as archive:
+            archive.writestr("manifest.json", json.dumps(cls.manifest(job), indent=2))
+            for result in job["results"].values():
+                if "file" in result:
+                    archive.write(os.path.join(cls._dir(job["id"]), result["file"]), result["file"])
+        os.replace(archive_file + ".tmp", archive_file)
+        finished = time.time()
+        cls._record(job, {"finished": finished})
+        with cls._cond:
+            job.update(status="completed", finished=finished)
+            cls.stats["completed"] += 1
+        log(f"Batch job {job['id']} completed: {len(items)} items")
+
+    @classmethod
+    def _run_item(cls, job: dict, index: int):
+        if job["status"] == "deleted":
+            return
+        item = job["items"][index]
+        Metrics.reset(endpoint="/jobs", language=item["language"], speaker=item["speaker"], priority="background")
+        try:
+            speaker_wav = os.path.join(speaker_path, item["language"], item["speaker"] + ".wav")
+            while True:
+                try:
+                    wav = synthesize(item["text"], item["language"], speaker_wav, priority="background")
+                    break
+                except QueueFullError as e:
+                    if job["status"] == "deleted":
+                        return
+                    time.sleep(e.retry_after)  # Back off while the queue is full
+            audio_bytes, _ = AudioEncoder.encode(wav, TTSManager.sample_rate, job["format"])
+            filename = f"{index:05d}_{re.sub(r'[^a-zA-Z0-9_-]', '_', item.get('name') or item['speaker'])}.{job['format']}"
+            with open(os.path.join(cls._dir(job["id"]), filename), "wb") as audio_file:
+                audio_file.write(audio_bytes)
+            cls._record(job, {"index": index, "file": filename})
+        except Exception as e:
+            if job["status"] == "deleted":
+                return
+            log(f"Batch job {job['id']} item {index} failed:", str(e))
+            cls._record(job, {"index": index, "error": str(e)})
+
+    @classmethod
+    def _record(cls, job: dict, record: dict):
+        # results.jsonl is the progress log a restarted server resumes from
+        with cls._cond:
+            if job["status"] == "deleted":
+                return
+            with open(os.path.join(cls._dir(job["id"]), "results.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            if "index" in record:
+                job["results"][record["index"]] = record
+                cls.stats["items_failed" if "error" in record else "items_done"] += 1
+
+    @classmethod
+    def get_stats(cls):
+        with cls._cond:
+            return {
+                **cls.stats,
+                "jobs": len(cls._jobs),
+                "pending": len(cls._pending),
+                "running": sum(1 for job in cls._jobs.values() if job["status"] == "running"),
+                "parallel": cls.parallel
+            }
 
 
 # ##### OpenAI voice mapping
@@ -196,6 +2984,18 @@ def openai_audio_speech():
         input_text = data.get('input', '')
         voice = data.get('voice', 'alloy')
         response_format = data.get('response_format', 'wav')
+        stream = data.get('stream', False) is True
+        try:
+            options = PostProcessing.from_values(data)
+            priority, deadline = request_scheduling(data)
+        except InvalidParameterError as e:
+            return jsonify({
+                'error': {
+                    'message': str(e),
+                    'type': 'invalid_request_error',
+                    'param': e.param
+                }
+            }), 400
         
         # Validate input
         if not input_text:
@@ -212,11 +3012,11 @@ def openai_audio_speech():
                 }
             }), 400
         
-        # Only support wav format for now
-        if response_format != 'wav':
+        # Check if the output format is supported (compressed formats need ffmpeg)
+        if not AudioEncoder.is_available(response_format):
             return jsonify({
                 'error': {
-                    'message': f"Currently only 'wav' format is supported",
+                    'message': f"'{response_format}' is not a supported format. Supported formats are: {', '.join(f for f in AUDIO_FORMATS if AudioEncoder.is_available(f))}",
                     'type': 'invalid_request_error',
                     'param': 'response_format'
                 }
@@ -224,38 +3024,79 @@ def openai_audio_speech():
             
         # Map OpenAI voice to our system
         language, speaker = OPENAI_VOICE_MAPPING[voice]
-        
-        # Generate unique filename for the audio
-        output_filename = f"{uuid.uuid4()}.wav"
-        output_path = os.path.join(static_audio_path, output_filename)
-        
-        # Redirect stdout during TTS synthesis if not in debug mode
-        if not DEBUG:
-            old_stdout = sys.stdout
-            sys.stdout = StringIO()
-            
-        try:
-            tts_model = TTSManager.get_model()
-            speaker_wav = os.path.join(speaker_path, language, speaker + ".wav")
-            
-            tts_model.tts_to_file(
-                text=clean_text_for_tts(input_text),
-                file_path=output_path,
-                speaker_wav=speaker_wav,
-                language=language
+        Metrics.bind(language=language, speaker=speaker, priority=priority)
+
+        # Map the OpenAI model to a speed tier of the model registry
+        model_name = resolve_model(model, language)
+        if model_name is None:
+            return jsonify({
+                'error': {
+                    'message': f"Model '{model}' not found. Available models are: {', '.join(MODEL_REGISTRY.keys())}",
+                    'type': 'invalid_request_error',
+                    'param': 'model',
+                    'code': 'model_not_found'
+                }
+            }), 400
+        with Metrics.stage("clean_text"):
+            text = clean_text_for_tts(input_text)
+
+        speaker_wav = os.path.join(speaker_path, language, speaker + ".wav")
+
+        # Serve repeated requests from the audio cache without touching the model
+        cache_key = AudioCache.key(text, language, speaker, model_name, response_format, options.cache_key())
+        with Metrics.stage("cache_lookup"):
+            audio_bytes = AudioCache.get(cache_key)
+        mimetype = AUDIO_FORMATS[response_format][0]
+
+        if audio_bytes is None and stream:
+            # Send each sentence as soon as it is synthesized
+            InferenceScheduler.check_capacity(priority)
+            return Response(
+                stream_speech(text, language, speaker_wav, response_format, model_name, options, priority, deadline, disconnect_probe()),
+                mimetype=mimetype,
+                headers={'Content-Disposition': f'attachment; filename=speech.{response_format}'}
             )
-        finally:
-            if not DEBUG:
-                # Restore stdout
-                sys.stdout = old_stdout
+
+        encoding_seconds = 0.0
+        if audio_bytes is None:
+            # Encode straight from the waveform, nothing is written to disk
+            wav = synthesize(text, language, speaker_wav, model_name, priority, deadline, disconnect_probe())
+            TTSManager.clear_cuda()
+            wav = options.apply(wav, TTSManager.sample_rate)
+            audio_bytes, encoding_seconds = AudioEncoder.encode(wav, options.output_rate(TTSManager.sample_rate), response_format, not options.normalize)
+            AudioCache.put(cache_key, audio_bytes, response_format)
         
         # Send file response
-        return send_file(
-            output_path,
-            mimetype="audio/wav",
-            as_attachment=True,
-            download_name="speech.wav"
-        )
+        with Metrics.stage("response"):
+            response = send_file(
+                BytesIO(audio_bytes),
+                mimetype=mimetype,
+                as_attachment=True,
+                download_name=f"speech.{response_format}"
+            )
+        return add_audio_headers(response, audio_bytes, encoding_seconds)
+
+    except QueueFullError as e:
+        log("Request rejected:", str(e))
+        return jsonify({
+            'error': {
+                'message': str(e),
+                'type': 'server_busy'
+            }
+        }), 503, {'Retry-After': str(e.retry_after)}
+
+    except DeadlineExceededError as e:
+        log("Request dropped:", str(e))
+        return jsonify({
+            'error': {
+                'message': str(e),
+                'type': 'timeout'
+            }
+        }), 504
+
+    except ClientDisconnectedError as e:
+        log("Request dropped:", str(e))
+        return '', 499
             
     except Exception as e:
         error_message = str(e)
@@ -272,17 +3113,12 @@ def openai_list_models():
     """List available TTS models (OpenAI compatible)"""
     models = [
         {
-            "id": "tts-1",
-            "object": "model",
-            "created": int(datetime.now().timestamp()),
-            "owned_by": "flextts"
-        },
-        {
-            "id": "tts-1-hd",
+            "id": model_id,
             "object": "model",
             "created": int(datetime.now().timestamp()),
             "owned_by": "flextts"
         }
+        for model_id in MODEL_REGISTRY
     ]
     
     return jsonify({"data": models, "object": "list"})
@@ -290,7 +3126,7 @@ def openai_list_models():
 @app.route('/v1/models/<model_id>', methods=['GET'])
 def openai_get_model(model_id):
     """Get details for a specific model (OpenAI compatible)"""
-    if model_id not in ["tts-1", "tts-1-hd"]:
+    if model_id not in MODEL_REGISTRY:
         return jsonify({
             'error': {
                 'message': f"Model '{model_id}' not found",
@@ -313,31 +3149,116 @@ def openai_get_model(model_id):
 @app.route('/v1/voices', methods=['GET'])
 def openai_list_voices():
     """List available voices (OpenAI compatible for Open WebUI)"""
-    voices = []
-    
-    # Add standard OpenAI voice mappings
-    for voice_id in OPENAI_VOICE_MAPPING.keys():
-        voices.append({
-            "voice_id": voice_id,
-            "name": voice_id.capitalize()
-        })
-    
-    # Add all speakers as additional voices
-    languages = get_languages_data()
-    for language, speakers in languages.items():
-        for speaker in speakers:
-            speaker_id = speaker.lower().replace(' ', '_')
-            # Avoid duplicates with OpenAI voices
-            if speaker_id not in [v[1] for v in OPENAI_VOICE_MAPPING.values()]:
-                voices.append({
-                    "voice_id": f"{language}_{speaker_id}",
-                    "name": f"{language.capitalize()} - {speaker}"
-                })
-    
-    return jsonify({"voices": voices})
+    return catalog_response("voices")
 
 # ##### Flask routes
 
+@app.before_request
+def start_request_metrics():
+    """Label everything the request records with its endpoint"""
+    Metrics.reset(endpoint=request.url_rule.rule if request.url_rule else "unknown", language="", speaker="", priority="")
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def finish_request_metrics(response):
+    """Count the request and record its duration (time to first byte for streams)"""
+    labels = Metrics.labels()
+    if "request_started" in g and labels.get("endpoint") != "/metrics":
+        Metrics.inc("flextts_requests_total", endpoint=labels["endpoint"], status=str(response.status_code))
+        Metrics.observe("flextts_request_duration_seconds", time.perf_counter() - g.request_started, **labels)
+    return response
+
+
+PROFILED_ENDPOINTS = {"handle_tts", "openai_audio_speech", "stream_text"}
+
+
+@app.before_request
+def start_request_profile():
+    """Profile synthesis requests the operator selected - nothing else to check while PROFILE_TOKEN is unset"""
+    if Profiler.token is None:
+        return
+    profile = None
+    if request.method == 'POST' and request.endpoint in PROFILED_ENDPOINTS:
+        trigger = Profiler.select(request.headers.get('X-Profile'))
+        if trigger:
+            profile, g.profiler = Profiler.begin(trigger)
+            g.profile = (profile, trigger)
+    Profiler.bind(profile)
+
+
+@app.after_request
+def finish_request_profile(response):
+    """Write the request profile and tell the client its id (streamed sentences are added while they are synthesized)"""
+    if "profile" in g:
+        profile, trigger = g.profile
+        description = f"{request.method} {request.full_path.rstrip('?')} - {response.status}, profiled by {trigger} at {datetime.now().isoformat(timespec='seconds')}"
+        Profiler.finish(profile, g.profiler, description)
+        response.headers['X-Profile-Id'] = os.path.basename(profile)
+    return response
+
+
+def external_url(endpoint: str, **values) -> str:
+    """Absolute URL for clients, with the published port when running in Docker"""
+    url = url_for(endpoint, _external=True, **values)
+    if docker_port:
+        # Replace port in URL if running in Docker
+        url = re.sub(r':\d+/', f':{docker_port}/', url)
+    return url
+
+
+def collect_stats():
+    """Statistics of all components"""
+    return {
+        'model': ModelLoader.get_stats(),
+        'models': TTSManager.get_stats(),
+        'audio_cache': AudioCache.get_stats(),
+        'scheduler': InferenceScheduler.get_stats(),
+        'encoder': AudioEncoder.get_stats(),
+        'janitor': AudioJanitor.get_stats(),
+        'jobs': BatchJobs.get_stats(),
+        'profiler': Profiler.get_stats(),
+        'autotune': Autotuner.get_stats()
+    }
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the server answers requests - fails only if the model could not be loaded"""
+    if ModelLoader.state == "failed":
+        return jsonify({'status': 'failed', 'error': ModelLoader.error}), 503
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: the model is loaded and warmed up"""
+    return jsonify(ModelLoader.get_stats()), 200 if ModelLoader.is_ready() else 503
+
+
+@app.route('/autotune', methods=['GET'])
+def autotune_results():
+    """Worker layout chosen by the startup autotuner and the real-time factors it measured"""
+    replicas = InferenceScheduler._replicas
+    return jsonify({**Autotuner.get_stats(), 'applied': {
+        'replicas': len(replicas),
+        'threads': replicas[0].threads if replicas else torch.get_num_threads(),
+        'interop_threads': (replicas[0].interop_threads if replicas else torch.get_num_interop_threads()) or 'default'
+    }})
+
+
+@app.route('/stats', methods=['GET'])
+def server_stats():
+    """Runtime statistics for monitoring and capacity planning"""
+    return jsonify(collect_stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus metrics: stage timings, throughput and the runtime statistics as gauges"""
+    return Response(Metrics.render(collect_stats()), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/speakers', methods=['GET', 'POST'])
 def list_all_speakers():
     """List all available languages and their speakers"""
@@ -345,10 +3266,8 @@ def list_all_speakers():
         if not os.path.exists(speaker_path):
             return jsonify({'error': 'Speakers directory not found'}), 404
 
-        # Get all language directories
-        languages = get_languages_data()
-        
-        return jsonify(languages)
+        # All language directories, served from the speaker index
+        return catalog_response("speakers")
         
     except Exception as e:
         error_message = str(e)
@@ -360,31 +3279,16 @@ def list_all_speakers():
 def list_speakers(language):
     """List available speakers for a given language"""
     try:
-        speaker_dir = os.path.join(speaker_path, language)
-        
-        if not os.path.exists(speaker_dir):
+        if SpeakerIndex.payload("speakers/" + language) is None:
             if DEBUG:
                 log("ERROR - Language not found: " + language)
             return jsonify({
                 'error': f'Language not found: {language}',
-                'available_languages': [d for d in os.listdir(speaker_path) 
-                                     if os.path.isdir(os.path.join(speaker_path, d))]
+                'available_languages': SpeakerIndex.language_dirs()
             }), 404
             
-        # Get all .wav files and format their names
-        speakers = []
-        for file in os.listdir(speaker_dir):
-            if file.endswith('.wav'):
-                # Remove .wav and format the name
-                speaker_name = file[:-4]  # Remove .wav extension
-                speaker_name = speaker_name.replace('_', ' ')  # Replace underscores with spaces
-                speaker_name = ' '.join(word.capitalize() for word in speaker_name.split())  # Capitalize each word
-                speakers.append(speaker_name)
-                
-        return jsonify({
-            'language': language,
-            'speakers': sorted(speakers)  # Sort alphabetically
-        })
+        # Speakers are formatted and sorted alphabetically by the speaker index
+        return catalog_response("speakers/" + language)
         
     except Exception as e:
         error_message = str(e)
@@ -392,6 +3296,228 @@ def list_speakers(language):
         return jsonify({'error': error_message}), 500
 
 
+TEXT_STREAM_MAX_PENDING = int(os.getenv("TEXT_STREAM_MAX_PENDING", "4"))  # Segments read ahead of synthesis
+
+
+def read_text_stream(stream, feed: SegmentFeed):
+    """Reader thread of /stream: each sentence goes to the feed as soon as the next one starts, the rest at the end"""
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    buffer = ''
+    try:
+        while not feed.closed:
+            # Chunked request bodies only return full reads, so read byte by byte to never wait for more than has arrived
+            data = stream.read(1)
+            if not data:
+                break
+            char = decoder.decode(data)
+            buffer += char
+            if char.isspace() and buffer.strip():
+                sentences = split_sentences(buffer, feed.language)
+                if len(sentences) > 1:
+                    for sentence in sentences[:-1]:
+                        feed.put(sentence)
+                    buffer = sentences[-1] + char
+                elif len(buffer) > SEGMENT_MAX_CHARS:
+                    # No sentence end in sight - don't let the listener wait for it
+                    feed.put(buffer)
+                    buffer = ''
+        buffer += decoder.decode(b'', final=True)
+        if buffer.strip():
+            feed.put(buffer)
+    except Exception as e:
+        log("ERROR reading text stream:", str(e))
+    finally:
+        feed.close()
+
+
+@app.route('/stream', methods=['POST'])
+def stream_text():
+    """Speak text while it is still being written: text fragments in the (chunked) request body, audio streamed back"""
+    values = request.args
+    language = values.get('language', default['language'])
+    speaker = values.get('speaker', default['speaker']).lower().replace(' ', '_')
+    if values.get('voice'):
+        if values['voice'] not in OPENAI_VOICE_MAPPING:
+            return jsonify({'error': 'Invalid voice. Must be one of: ' + ', '.join(f'"{voice}"' for voice in OPENAI_VOICE_MAPPING)}), 400
+        language, speaker = OPENAI_VOICE_MAPPING[values['voice']]
+    audio_format = values.get('format', 'pcm')
+    if not AudioEncoder.is_available(audio_format):
+        return jsonify({'error': 'Invalid format. Must be one of: ' + ', '.join(f'"{f}"' for f in AUDIO_FORMATS if AudioEncoder.is_available(f))}), 400
+    model_name = None
+    if values.get('model'):
+        model_name = resolve_model(values['model'], language)
+        if model_name is None:
+            return jsonify({'error': 'Model not found: ' + values['model']}), 400
+
+    try:
+        speaker_wav = resolve_speaker(language, speaker)
+        options = PostProcessing.from_values(values)
+        priority, deadline = request_scheduling(values)
+        InferenceScheduler.check_capacity(priority)
+    except InvalidParameterError as e:
+        return jsonify({'error': str(e)}), 400
+    except QueueFullError as e:
+        log("Request rejected:", str(e))
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+    Metrics.bind(language=language, speaker=speaker, priority=priority)
+
+    # The body is read on its own thread while the response is being sent on this one
+    feed = SegmentFeed(language, TEXT_STREAM_MAX_PENDING)
+    threading.Thread(target=read_text_stream, args=(request.stream, feed), name="flextts-text-reader", daemon=True).start()
+    return Response(stream_speech(feed, language, speaker_wav, audio_format, model_name, options, priority, deadline, disconnect_probe()),
+                    mimetype=AUDIO_FORMATS[audio_format][0])
+
+
+@app.route('/jobs', methods=['GET', 'POST'])
+def batch_jobs():
+    """Create a batch job from a JSON list (or {"items": [...], "format": ...}) or a JSONL body, or list all jobs"""
+    if request.method == 'GET':
+        return jsonify({'jobs': [BatchJobs.summary(job) for job in BatchJobs.list_jobs()]})
+
+    audio_format = request.args.get('format', 'wav')
+    try:
+        if request.is_json:
+            data = json.loads(request.get_data(as_text=True))
+            if isinstance(data, dict):
+                audio_format = data.get('format', audio_format)
+                data = data.get('items')
+        else:
+            data = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+    except ValueError as e:
+        return jsonify({'error': f'Invalid JSON: {e}'}), 400
+
+    if not isinstance(data, list) or not data:
+        return jsonify({'error': 'No items provided'}), 400
+    if len(data) > BatchJobs.max_items:
+        return jsonify({'error': f'Too many items: {len(data)} (maximum: {BatchJobs.max_items})'}), 400
+    if not AudioEncoder.is_available(audio_format):
+        return jsonify({'error': 'Invalid format. Must be one of: ' + ', '.join(f'"{f}"' for f in AUDIO_FORMATS if AudioEncoder.is_available(f))}), 400
+
+    items = []
+    for index, entry in enumerate(data):
+        if not isinstance(entry, dict) or not entry.get('text'):
+            return jsonify({'error': f'Item {index}: no text provided'}), 400
+        language = entry.get('language', default['language'])
+        speaker = str(entry.get('speaker', default['speaker'])).lower().replace(' ', '_')
+        if not re.match("^[a-zA-Z0-9_\-]+$", speaker) or not SpeakerIndex.has_speaker(language, speaker):
+            return jsonify({'error': f'Item {index}: speaker not found: {speaker} (language: {language})'}), 400
+        item = {'text': str(entry['text']), 'language': language, 'speaker': speaker}
+        if entry.get('name'):
+            item['name'] = str(entry['name'])
+        items.append(item)
+
+    job = BatchJobs.create(items, audio_format)
+    log(f"Batch job {job['id']} created: {len(items)} items")
+    return jsonify({**BatchJobs.summary(job), 'url': external_url('batch_job', job_id=job['id'])}), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+def batch_job(job_id):
+    """Progress of a batch job, or cancel and delete it"""
+    if request.method == 'DELETE':
+        if not BatchJobs.delete(job_id):
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'job_id': job_id, 'status': 'deleted'})
+
+    job = BatchJobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    response_data = BatchJobs.summary(job)
+    response_data['manifest_url'] = external_url('batch_job_manifest', job_id=job_id)
+    if job['status'] == 'completed':
+        response_data['archive_url'] = external_url('batch_job_archive', job_id=job_id)
+    return jsonify(response_data)
+
+
+@app.route('/jobs/<job_id>/manifest', methods=['GET'])
+def batch_job_manifest(job_id):
+    """Every item with the URL of its audio file (or its error) - available while the job is running"""
+    job = BatchJobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    url = lambda index: external_url('batch_job_item', job_id=job_id, index=index)
+    return jsonify({**BatchJobs.summary(job), 'items': BatchJobs.manifest(job, url)})
+
+
+@app.route('/jobs/<job_id>/items/<int:index>', methods=['GET'])
+def batch_job_item(job_id, index):
+    """Audio file of one item"""
+    job = BatchJobs.get(job_id)
+    path = BatchJobs.item_path(job, index) if job is not None else None
+    if path is None:
+        return jsonify({'error': 'Item not found or not synthesized yet'}), 404
+    return send_file(path, mimetype=AUDIO_FORMATS[job['format']][0])
+
+
+@app.route('/jobs/<job_id>/archive', methods=['GET'])
+def batch_job_archive(job_id):
+    """Zip archive with all audio files and manifest.json, once the job is completed"""
+    job = BatchJobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    path = BatchJobs.archive_path(job)
+    if path is None:
+        return jsonify({'error': 'Job not completed yet', **BatchJobs.summary(job)}), 409
+    return send_file(path, mimetype='application/zip', as_attachment=True, download_name=f'{job_id}.zip')
+
+
+def profiling_denied():
+    """Error response unless profiling is enabled and the request carries the token (X-Profile or Authorization: Bearer)"""
+    if Profiler.token is None:
+        return jsonify({'error': 'Profiling is disabled. Set PROFILE_TOKEN to enable it'}), 404
+    authorization = request.headers.get('Authorization', '')
+    token = request.headers.get('X-Profile') or (authorization[7:] if authorization.startswith('Bearer ') else None)
+    if not Profiler.authorized(token):
+        return jsonify({'error': 'Invalid profiling token'}), 403
+    return None
+
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def admin_profiling():
+    """Profiling state and profiles on disk - POST {"sample_rate": 0.05, "duration_seconds": 600} to sample requests"""
+    denied = profiling_denied()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        values = request.get_json(silent=True) or request.form
+        try:
+            rate = float(values.get('sample_rate', 0))
+            seconds = float(values.get('duration_seconds', 600))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'sample_rate and duration_seconds must be numbers'}), 400
+        if not 0 <= rate <= 1 or seconds <= 0:
+            return jsonify({'error': 'sample_rate must be between 0 and 1, duration_seconds greater than 0'}), 400
+        Profiler.set_sampling(rate, seconds)
+        log(f"Profiling: sampling {rate:.1%} of the synthesis requests" + (f" for {seconds:.0f}s" if rate > 0 else ""))
+    return jsonify({**Profiler.get_stats(), 'profiles': [
+        {**profile, 'url': external_url('admin_profile', profile_id=profile['id'])} for profile in Profiler.list_profiles()
+    ]})
+
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+def admin_profile(profile_id):
+    """Text summary of a profile: top functions of the request, top operators and functions of each sentence"""
+    denied = profiling_denied()
+    if denied:
+        return denied
+    summary = Profiler.summary(profile_id)
+    if summary is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(summary, mimetype='text/plain')
+
+
+@app.route('/admin/profiles/<profile_id>/<filename>', methods=['GET'])
+def admin_profile_file(profile_id, filename):
+    """One file of a profile - Chrome traces (.trace.json), pstats files (.pstats) or summaries (.txt)"""
+    denied = profiling_denied()
+    if denied:
+        return denied
+    path = Profiler.profile_path(profile_id, filename)
+    if path is None or os.path.isdir(path):
+        return jsonify({'error': 'File not found'}), 404
+    return send_file(path, as_attachment=not filename.endswith('.txt'), download_name=filename)
+
+
 @app.route('/', methods=['GET', 'POST'])
 def handle_tts():
     """Handle TTS requests and index page"""
@@ -411,14 +3537,21 @@ def handle_tts():
                             'text': 'Text to convert to speech',
                             'language': f'Language code (default: {default["language"]})',
                             'speaker': f'Speaker file name (default: {default["speaker"]})',
-                            'response_type': 'Response type: "base64", "file" or "url" (default: "url")'
+                            'response_type': 'Response type: "base64", "file", "stream" or "url" (default: "url")',
+                            'format': 'Audio format: "wav", "mp3", "opus", "aac", "flac" or "pcm" (default: "wav")',
+                            'sample_rate': 'Output sample rate, 8000 to 48000 (default: 24000)',
+                            'speed': 'Speaking rate, 0.25 to 4.0 (default: 1.0)',
+                            'trim_silence': 'Cut silence at the start and end (default: false)',
+                            'normalize': 'Normalize the loudness (default: false)',
+                            'priority': 'Priority lane: "interactive", "standard" or "background" (default: "interactive")',
+                            'deadline_ms': 'Drop the request if the audio is not ready in time (optional)'
                         },
                         'returns': {
                             'text': 'Text to convert to speech',
-                            'audio_data': 'Base64 encoded WAV audio (when response_type=base64)',
+                            'audio_data': 'Base64 encoded audio (when response_type=base64)',
                             'url': 'URL to the generated audio file (when response_type=url)',
-                            'format': 'Audio format (wav)'
-                            # or the file itself if response_type=file
+                            'format': 'Audio format'
+                            # or the file itself if response_type=file (chunked while synthesizing if response_type=stream)
                         }
                     }
                 },
@@ -428,10 +3561,12 @@ def handle_tts():
                         'POST /v1/audio/speech': {
                             'description': 'Converts text to speech using OpenAI format',
                             'parameters': {
-                                'model': 'TTS model ("tts-1" or "tts-1-hd")',
+                                'model': 'TTS model ("tts-1": fast, "tts-1-hd": XTTS quality)',
                                 'input': 'Text to convert to speech',
                                 'voice': 'One of "alloy", "echo", "fable", "onyx", "nova", "shimmer"',
-                                'response_format': 'Currently only "wav" is supported'
+                                'response_format': 'One of "wav", "mp3", "opus", "aac", "flac", "pcm" (default: "wav")',
+                                'stream': 'Stream audio sentence by sentence while synthesizing (default: false)',
+                                'speed': 'Speaking rate, 0.25 to 4.0 (default: 1.0)'
                             }
                         },
                         'GET /v1/models': 'Lists available TTS models',
@@ -443,14 +3578,12 @@ def handle_tts():
         return render_template('index.html', languages=languages, selected_language=selected_language, selected_speaker=selected_speaker)
         
     try:
-        # Clean up old files
-        cleanup_old_files(static_audio_path)
-
         # Get text from request
         text = request.form.get('text', '')
         language = request.form.get('language', default['language'])
         speaker = request.form.get('speaker', default['speaker'])
         response_type = request.form.get('response_type', 'url')
+        audio_format = request.form.get('format', 'wav')
         trackingid = request.form.get('trackingid', "NONE")
 
         if request.is_json:
@@ -462,83 +3595,86 @@ def handle_tts():
             if speaker == default['speaker']:
                 speaker = data.get('speaker', default['speaker'])
             response_type = data.get('response_type', 'url')
+            audio_format = data.get('format', audio_format)
 
         # Convert display speaker name to filename format
         speaker = speaker.lower().replace(' ', '_')
 
+        try:
+            values = request.get_json() if request.is_json else request.form
+            options = PostProcessing.from_values(values)
+            priority, deadline = request_scheduling(values)
+        except InvalidParameterError as e:
+            return jsonify({'error': str(e)}), 400
+
         # Validate response_type
-        if response_type not in ['base64', 'url', "file"]:
-            return jsonify({'error': 'Invalid response_type. Must be either "base64", "file" or "url"'}), 400
+        if response_type not in ['base64', 'url', "file", "stream"]:
+            return jsonify({'error': 'Invalid response_type. Must be either "base64", "file", "stream" or "url"'}), 400
 
-        # speaker_regex test: only letters, underscores and dashes and numbers allowed!
-        if not re.match("^[a-zA-Z0-9_\-]+$", speaker):
-            log("ERROR - Invalid speaker name: " + speaker)
-            return jsonify({'error': 'Invalid speaker name'}), 400
+        # Validate format (compressed formats need ffmpeg)
+        if not AudioEncoder.is_available(audio_format):
+            return jsonify({'error': 'Invalid format. Must be one of: ' + ', '.join(f'"{f}"' for f in AUDIO_FORMATS if AudioEncoder.is_available(f))}), 400
 
-        speaker_wav = os.path.join(speaker_path, language, speaker + ".wav")
-        if not os.path.exists(speaker_wav):
-            log("ERROR - Speaker not found: " + speaker + " (language: " + language + ") - " + speaker_wav)
-            return jsonify({'error': 'Speaker not found: ' + speaker + ' (language: ' + language + ')'}), 400
+        try:
+            speaker_wav = resolve_speaker(language, speaker)
+        except InvalidParameterError as e:
+            return jsonify({'error': str(e)}), 400
         
         if not text:
             return jsonify({'error': 'No text provided'}), 400
+        Metrics.bind(language=language, speaker=speaker, priority=priority)
         
-        # Generate unique filename for the audio
-        output_filename = f"{uuid.uuid4()}.wav"
-        output_path = os.path.join(static_audio_path, output_filename)
-        
-        # Generate speech using the speaker.wav file as reference
-        if not DEBUG:
-            # Redirect stdout during TTS synthesis
-            old_stdout = sys.stdout
-            sys.stdout = StringIO()
-            
-        try:
-            tts_model = TTSManager.get_model()
-            tts_model.tts_to_file(
-                text=text,
-                file_path=output_path,
-                speaker_wav=speaker_wav,
-                language=language
-            )
-        finally:
-            if not DEBUG:
-                # Restore stdout
-                sys.stdout = old_stdout
+        # Repeated announcements are served from the audio cache without touching the model
+        cache_key = AudioCache.key(text, language, speaker, TTSManager.model_name, audio_format, options.cache_key())
+        with Metrics.stage("cache_lookup"):
+            audio_bytes = AudioCache.get(cache_key)
+        mimetype = AUDIO_FORMATS[audio_format][0]
+        if DEBUG and audio_bytes is not None:
+            log("Audio cache hit: " + cache_key)
+
+        if audio_bytes is None and response_type == 'stream':
+            # Send each sentence as soon as it is synthesized
+            InferenceScheduler.check_capacity(priority)
+            return Response(stream_speech(text, language, speaker_wav, audio_format, None, options, priority, deadline, disconnect_probe()), mimetype=mimetype)
+
+        encoding_seconds = 0.0
+        if audio_bytes is None:
+            # Generate speech using the speaker.wav file as reference, encoded in memory
+            wav = synthesize(text, language, speaker_wav, None, priority, deadline, disconnect_probe())
+            # Clear CUDA cache after generation
+            TTSManager.clear_cuda()
+            wav = options.apply(wav, TTSManager.sample_rate)
+            audio_bytes, encoding_seconds = AudioEncoder.encode(wav, options.output_rate(TTSManager.sample_rate), audio_format, not options.normalize)
+            AudioCache.put(cache_key, audio_bytes, audio_format)
         
         # Prepare response based on response_type
         response_data = {
             'text': text,
-            'format': 'wav'
+            'format': audio_format
         }
 
-        if response_type == 'base64':
-            with open(output_path, 'rb') as audio_file:
-                audio_data = base64.b64encode(audio_file.read()).decode('utf-8')
-                
-            # Clean up the file since we've encoded it
-            try:
-                os.remove(output_path)
-            except Exception as e:
-                log(f"Error removing temporary file {output_path}: {e}")
-                
-            # Clear CUDA cache after generation
-            TTSManager.clear_cuda()
-            
-            response_data['audio_data'] = audio_data
-            response_data['encoding'] = 'base64'
-        
-        else:  # URL response
+        if response_type == 'url':
+            # Only URL responses need a file. It is tracked by the janitor, so the URL stays valid for AUDIO_MAX_AGE_HOURS
+            # even if the audio cache evicts its own copy - which is shared as a hardlink if there is one
+            output_filename = f"{uuid.uuid4()}.{audio_format}"
+            output_path = os.path.join(static_audio_path, output_filename)
+            cached_path = AudioCache.file_path(cache_key)
+            with Metrics.stage("file_write"):
+                try:
+                    if cached_path is None:
+                        raise FileNotFoundError(cache_key)
+                    os.link(cached_path, output_path)
+                except OSError:
+                    # Not in the disk tier (any more), or no hardlinks on this filesystem
+                    with open(output_path, 'wb') as audio_file:
+                        audio_file.write(audio_bytes)
+            AudioJanitor.track(output_path, len(audio_bytes))
+
             # Generate URL for the audio file
-            audio_url = url_for('static', filename=f'audio/{output_filename}', _external=True)
-            if docker_port:
-                # Replace port in URL if running in Docker
-                audio_url = re.sub(r':\d+/', f':{docker_port}/', audio_url)
-            
-            # Clear CUDA cache after generation
-            TTSManager.clear_cuda()
-            
-            response_data['url'] = audio_url
+            response_data['url'] = external_url('static', filename=f'audio/{output_filename}')
+
+        elif response_type == 'base64':
+            response_data['encoding'] = 'base64'
 
         if trackingid != "NONE":
             response_data['trackingid'] = trackingid
@@ -548,24 +3684,46 @@ def handle_tts():
 
         # Return the response based on the request type / platform
 
-        # FILE RESPONSE:
-        if response_type == 'file':
-            return send_file(
-                output_path,
-                mimetype="audio/wav",
-                as_attachment=False)
+        # FILE / STREAM RESPONSE (cache hit):
+        if response_type in ('file', 'stream'):
+            with Metrics.stage("response"):
+                response = send_file(
+                    BytesIO(audio_bytes),
+                    mimetype=mimetype,
+                    as_attachment=False)
+            return add_audio_headers(response, audio_bytes, encoding_seconds)
 
         # JSON RESPONSE:
         if request.headers.get('Accept', '').find('application/json') != -1 or request.is_json:
-            return jsonify(response_data)
+            if response_type == 'base64':
+                with Metrics.stage("base64"):
+                    response = base64_json_response(response_data, audio_bytes)
+                return add_audio_headers(response, audio_bytes, encoding_seconds)
+            return add_audio_headers(jsonify(response_data), audio_bytes, encoding_seconds)
         
         # HTML INTERFACE ONLY:
         return render_template('index.html', 
-                             audio_data=response_data.get('audio_data'), 
+                             audio_data=base64.b64encode(audio_bytes).decode('ascii') if response_type == 'base64' else None, 
                              input_text=text,
                              languages=get_languages_data(),
                              selected_language=language,
                              selected_speaker=speaker.replace('_', ' ').title())
+
+    except QueueFullError as e:
+        log("Request rejected:", str(e))
+        if request.headers.get('Accept', '').find('application/json') != -1 or request.is_json:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+        return f'Error: {e}', 503, {'Retry-After': str(e.retry_after)}
+
+    except DeadlineExceededError as e:
+        log("Request dropped:", str(e))
+        if request.headers.get('Accept', '').find('application/json') != -1 or request.is_json:
+            return jsonify({'error': str(e)}), 504
+        return f'Error: {e}', 504
+
+    except ClientDisconnectedError as e:
+        log("Request dropped:", str(e))
+        return '', 499
         
     except Exception as e:
         error_message = str(e)
@@ -575,6 +3733,15 @@ def handle_tts():
         return f'Error: {error_message}', 500
 
 
+# ##### Background services
+
+if not is_replica:
+    SpeakerIndex.start()
+    AudioJanitor.start()
+    ModelLoader.start()
+    BatchJobs.start()
+
+
 # ##### Run the app without WSGI 
 # for limited usage, e.g. local network only
 # Use an WSGI server to expose to the internet (if your server can handle that...)
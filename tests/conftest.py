@@ -0,0 +1,35 @@
+"""Tests import FlexTTS with the stub model of benchmark.py and a throwaway data directory"""
+
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark  # noqa: E402
+
+os.environ[benchmark.STUB_ENV] = json.dumps({"load_ms": 0, "conditioning_ms": 0, "latency_ms": 5, "ms_per_char": 0.1, "audio_per_char": 0.06})
+benchmark.install_stub()
+app_path = tempfile.mkdtemp(prefix="flextts-tests-")
+atexit.register(shutil.rmtree, app_path, True)
+benchmark.write_speaker(os.path.join(app_path, "data", "speakers", "en", "test.wav"))
+os.environ.update({"APP_PATH": app_path, "DEFAULT_LANGUAGE": "en", "DEFAULT_SPEAKER": "test", "CUDA_VISIBLE_DEVICES": ""})
+
+import flextts as flextts_module  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def flextts():
+    """The FlexTTS module with its stub model loaded and warmed up"""
+    assert flextts_module.ModelLoader.wait(60), flextts_module.ModelLoader.error
+    return flextts_module
+
+
+@pytest.fixture
+def client(flextts):
+    return flextts.app.test_client()
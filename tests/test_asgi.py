@@ -0,0 +1,61 @@
+import asyncio
+import json
+import socket
+import threading
+
+import pytest
+
+
+def test_probe_of_tls_socket_is_not_a_disconnect(flextts):
+    class TLSLikeSocket(socket.socket):
+        def recv(self, *args):
+            raise ValueError("non-zero flags not allowed in calls to recv() on <class 'ssl.SSLSocket'>")
+
+    left, right = socket.socketpair()
+    connection = TLSLikeSocket(fileno=left.detach())
+    try:
+        right.sendall(b"x")  # Readable, so the probe peeks
+        with flextts.app.test_request_context(environ_base={"werkzeug.socket": connection}):
+            assert flextts.disconnect_probe()() is False
+    finally:
+        connection.close()
+        right.close()
+
+
+def test_asgi_disconnect_drops_the_request(flextts, monkeypatch):
+    asgi = pytest.importorskip("asgi")
+    started, release = threading.Event(), threading.Event()
+    infer_sentence = flextts.infer_sentence
+
+    def gated_infer(text, *args, **kwargs):
+        started.set()
+        release.wait(10)
+        return infer_sentence(text, *args, **kwargs)
+
+    monkeypatch.setattr(flextts, "infer_sentence", gated_infer)
+    body = json.dumps({"text": "The client hangs up before this is done.", "response_type": "file"}).encode()
+    scope = {"type": "http", "method": "POST", "path": "/", "query_string": b"", "root_path": "", "http_version": "1.1", "scheme": "http",
+             "server": ("testserver", 80), "client": ("127.0.0.1", 50000),
+             "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]}
+    sent = []
+
+    async def run():
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi.app(scope, receive, send)
+
+    try:
+        asyncio.run(asyncio.wait_for(run(), 10))
+    finally:
+        release.set()
+    assert sent[0]["status"] == 499
@@ -0,0 +1,54 @@
+import os
+
+
+def test_disk_index_skips_files_being_written(flextts):
+    cache = flextts.AudioCache
+    os.makedirs(cache.directory, exist_ok=True)
+    done, writing = "a" * 64, "b" * 64
+    paths = [os.path.join(cache.directory, f"{done}.wav"), os.path.join(cache.directory, f"{writing}.wav.0123abcd.tmp")]
+    for path in paths:
+        with open(path, "wb") as audio_file:
+            audio_file.write(b"RIFF")
+    try:
+        with cache._lock:
+            cache._disk = None
+            index = cache._disk_index()
+        assert done in index
+        assert writing not in index
+    finally:
+        for path in paths:
+            os.remove(path)
+        with cache._lock:
+            cache._disk = None
+
+
+def test_disk_hit_survives_concurrent_eviction(flextts, monkeypatch):
+    cache = flextts.AudioCache
+    key = cache.key("Evicted while read.", "en", "test", "model", "wav")
+    cache.put(key, b"RIFF-evicted", "wav")
+    with cache._lock:
+        cache._memory_bytes -= len(cache._memory.pop(key))
+
+    def evict_while_reading(path, *args):
+        # A put on another thread evicts the entry between the read and the LRU update
+        with cache._lock:
+            cache._drop_disk(key)
+
+    monkeypatch.setattr(flextts.os, "utime", evict_while_reading)
+    assert cache.get(key) == b"RIFF-evicted"
+
+
+def test_url_survives_cache_eviction(flextts, client):
+    cache = flextts.AudioCache
+    request = {"text": "Still here after eviction.", "response_type": "url"}
+    client.post("/", json=request)
+    url = client.post("/", json=request).get_json()["url"]
+    filename = url.rsplit("/static/audio/", 1)[1]
+    assert "/" not in filename
+    # The cache evicts the entry the response was served from
+    with cache._lock:
+        for key in list(cache._disk):
+            os.remove(os.path.join(cache.directory, cache._disk[key][0]))
+            cache._drop_disk(key)
+    with open(os.path.join(flextts.static_audio_path, filename), "rb") as audio_file:
+        assert audio_file.read(4) == b"RIFF"
@@ -0,0 +1,22 @@
+import os
+import time
+
+
+def test_cached_url_is_tracked_for_its_retention_window(flextts, client):
+    janitor, cache = flextts.AudioJanitor, flextts.AudioCache
+    request = {"text": "Kept for the whole retention window.", "response_type": "url"}
+    client.post("/", json=request)
+    requested_at = time.time()
+    url = client.post("/", json=request).get_json()["url"]
+    path = os.path.join(flextts.static_audio_path, url.rsplit("/static/audio/", 1)[1])
+    with janitor._cond:
+        expiry = [expires_at for expires_at, tracked, _ in janitor._heap if tracked == path]
+    assert len(expiry) == 1
+    assert expiry[0] >= requested_at + janitor.max_age
+
+    # Expiring the URL file leaves the cached audio alone
+    os.remove(path)
+    misses = cache.get_stats()["misses"]
+    url = client.post("/", json=request).get_json()["url"]
+    assert cache.get_stats()["misses"] == misses
+    assert os.path.exists(os.path.join(flextts.static_audio_path, url.rsplit("/static/audio/", 1)[1]))
@@ -0,0 +1,41 @@
+import json
+import os
+import time
+
+
+def test_resumed_job_skips_completed_items(flextts, monkeypatch):
+    jobs = flextts.BatchJobs
+    items = [{"text": f"Item number {index}.", "language": "en", "speaker": "test"} for index in range(3)]
+    job_id = "resumed" + "0" * 25
+    job_dir = os.path.join(flextts.jobs_path, job_id)
+    os.makedirs(job_dir)
+    with open(os.path.join(job_dir, "job.json"), "w", encoding="utf-8") as f:
+        json.dump({"id": job_id, "format": "wav", "created": time.time(), "items": items}, f)
+    # A previous run finished the first item, failed the second and was stopped while writing the third
+    with open(os.path.join(job_dir, "00000_test.wav"), "wb") as audio_file:
+        audio_file.write(b"RIFF-done")
+    with open(os.path.join(job_dir, "results.jsonl"), "w", encoding="utf-8") as f:
+        f.write(json.dumps({"index": 0, "file": "00000_test.wav"}) + "\n")
+        f.write(json.dumps({"index": 1, "error": "Out of memory"}) + "\n")
+        f.write('{"index": 2, "fi')
+
+    synthesized = []
+    synthesize = flextts.synthesize
+
+    def recording_synthesize(text, *args, **kwargs):
+        synthesized.append(text)
+        return synthesize(text, *args, **kwargs)
+
+    monkeypatch.setattr(flextts, "synthesize", recording_synthesize)
+    jobs.start()
+    deadline = time.monotonic() + 10
+    while jobs.get(job_id)["status"] != "completed" and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    job = jobs.get(job_id)
+    assert job["status"] == "completed"
+    assert synthesized == ["Item number 2."]
+    assert job["results"][0] == {"index": 0, "file": "00000_test.wav"}
+    assert job["results"][1]["error"] == "Out of memory"
+    assert "file" in job["results"][2]
+    jobs.delete(job_id)
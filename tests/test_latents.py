@@ -0,0 +1,58 @@
+import os
+import shutil
+import threading
+
+import benchmark
+
+
+def test_precompute_prunes_latents_of_removed_and_replaced_speakers(flextts, tmp_path):
+    cache = flextts.SpeakerLatentCache
+    removed, replaced = str(tmp_path / "removed.wav"), str(tmp_path / "replaced.wav")
+    benchmark.write_speaker(removed)
+    benchmark.write_speaker(replaced)
+    cache.get(removed)
+    cache.get(replaced)
+    removed_file = cache._cache_file(flextts.TTSManager.model_name, removed, os.stat(removed).st_mtime_ns)
+    replaced_file = cache._cache_file(flextts.TTSManager.model_name, replaced, os.stat(replaced).st_mtime_ns)
+    assert os.path.exists(removed_file) and os.path.exists(replaced_file)
+
+    os.remove(removed)
+    with open(replaced, "ab") as wav_file:
+        wav_file.write(b"\0\0")
+    current_file = cache._cache_file(flextts.TTSManager.model_name, replaced, os.stat(replaced).st_mtime_ns)
+    cache.get(replaced)
+
+    cache.precompute()
+    assert not os.path.exists(removed_file)
+    assert not os.path.exists(replaced_file)
+    assert os.path.exists(current_file)
+    assert (flextts.TTSManager.model_name, removed) not in cache._latents
+
+
+def test_computing_one_speaker_does_not_block_others(flextts, tmp_path, monkeypatch):
+    cache = flextts.SpeakerLatentCache
+    slow, other = str(tmp_path / "slow.wav"), str(tmp_path / "other.wav")
+    benchmark.write_speaker(slow)
+    shutil.copy(slow, other)
+
+    xtts = flextts.TTSManager.get_model().synthesizer.tts_model
+    compute = xtts.get_conditioning_latents
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(audio_path, **kwargs):
+        if audio_path == slow:
+            started.set()
+            release.wait(10)
+        return compute(audio_path, **kwargs)
+
+    monkeypatch.setattr(xtts, "get_conditioning_latents", blocking)
+    slow_thread = threading.Thread(target=cache.get, args=(slow,))
+    slow_thread.start()
+    try:
+        assert started.wait(10)
+        # Computed while the slow speaker still holds its lock
+        assert cache.get(other) is not None
+        assert slow_thread.is_alive()
+    finally:
+        release.set()
+        slow_thread.join()
@@ -0,0 +1,16 @@
+import re
+
+
+def test_metric_families_are_unique(client):
+    client.post("/", json={"text": "Count me in the metrics.", "response_type": "file"})
+    body = client.get("/metrics").get_data(as_text=True)
+
+    families = re.findall(r"^# TYPE (\S+) \w+$", body, re.M)
+    assert "flextts_model_load_seconds" in families
+    assert len(families) == len(set(families))
+
+    # Every sample belongs to a declared family
+    for line in body.splitlines():
+        if line and not line.startswith("#"):
+            name = re.match(r"[a-zA-Z_:][a-zA-Z0-9_:]*", line).group(0)
+            assert re.sub(r"_(bucket|sum|count)$", "", name) in families or name in families, line
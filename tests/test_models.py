@@ -0,0 +1,50 @@
+import os
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def slow_models(flextts, monkeypatch):
+    """Models outside the registry that load once released - names containing "broken" fail. Returns (loading, release) events"""
+    stub = flextts.TTS
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_tts(model_name=None, **kwargs):
+        loading.set()
+        assert release.wait(10)
+        if "broken" in model_name:
+            raise RuntimeError("download failed")
+        return stub(model_name=model_name, **kwargs)
+
+    monkeypatch.setattr(flextts, "TTS", slow_tts)
+    yield loading, release
+    release.set()
+    with flextts.TTSManager._lock:
+        for model_name in [name for name in flextts.TTSManager._models if name.startswith("tts_models/test/")]:
+            flextts.TTSManager._unload(model_name, "test")
+
+
+def test_model_load_does_not_block_other_models(flextts, slow_models):
+    loading, release = slow_models
+    scheduler = flextts.InferenceScheduler
+    speaker_wav = os.path.join(flextts.speaker_path, "en", "test.wav")
+    slow = scheduler.submit("A voice from a new model.", "en", speaker_wav, admitted=True, model_name="tts_models/test/slow", coalesce=False)
+    assert loading.wait(10)
+
+    # The default model's sentence finishes while the other model is still loading
+    default = scheduler.submit("The default model is loaded.", "en", speaker_wav, admitted=True, coalesce=False)
+    assert len(default.result(timeout=10)) > 0
+    assert not slow.done()
+
+    release.set()
+    assert len(slow.result(timeout=10)) > 0
+
+
+def test_failed_model_load_fails_its_sentences(flextts, slow_models):
+    _, release = slow_models
+    release.set()
+    speaker_wav = os.path.join(flextts.speaker_path, "en", "test.wav")
+    future = flextts.InferenceScheduler.submit("Nobody will hear this.", "en", speaker_wav, admitted=True, model_name="tts_models/test/broken", coalesce=False)
+    with pytest.raises(RuntimeError, match="download failed"):
+        future.result(timeout=10)
@@ -0,0 +1,45 @@
+import pytest
+
+
+@pytest.fixture
+def profiler(flextts, monkeypatch):
+    """The Profiler with a token, a fixed clock and sampling switched off afterwards"""
+    profiler = flextts.Profiler
+    monkeypatch.setattr(profiler, "token", "secret")
+    monkeypatch.setattr(profiler, "_clock", lambda: 1000.0)
+    yield profiler
+    profiler.set_sampling(0.0, 0)
+
+
+def test_sampling_picks_the_given_share(profiler, monkeypatch):
+    profiler.set_sampling(0.25, 60)
+    monkeypatch.setattr(profiler, "_random", lambda: 0.249)
+    assert profiler.select(None) == "sampled"
+    monkeypatch.setattr(profiler, "_random", lambda: 0.25)
+    assert profiler.select(None) is None
+    assert profiler.select("secret") == "header"
+
+
+def test_sampling_switched_off_while_selecting(profiler, monkeypatch):
+    profiler.set_sampling(0.5, 60)
+    monkeypatch.setattr(profiler, "_random", lambda: 0.0)
+
+    def switched_off_meanwhile():
+        # Another thread ends sampling right between the reads of select()
+        profiler.sample_rate, profiler.sample_until = 0.0, None
+        return 1000.0
+
+    monkeypatch.setattr(profiler, "_clock", switched_off_meanwhile)
+    # The request saw sampling switched on, and the rate and end it read belong together
+    assert profiler.select(None) == "sampled"
+    assert profiler.select(None) is None
+
+
+def test_sampling_ends_after_its_duration(profiler, monkeypatch):
+    profiler.set_sampling(1.0, 60)
+    monkeypatch.setattr(profiler, "_random", lambda: 0.0)
+    monkeypatch.setattr(profiler, "_clock", lambda: 1059.0)
+    assert profiler.select(None) == "sampled"
+    monkeypatch.setattr(profiler, "_clock", lambda: 1061.0)
+    assert profiler.select(None) is None
+    assert profiler.sample_rate == 0.0 and profiler.sample_until is None
@@ -0,0 +1,41 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def hanging_replica(flextts):
+    class HangingReplica(flextts.ModelReplica):
+        """Replica process that takes jobs but never answers"""
+
+        def start(self):
+            self.conn, self.child_conn = multiprocessing.Pipe()
+            self.process = multiprocessing.get_context("fork").Process(target=time.sleep, args=(60,), daemon=True)
+            self.process.start()
+            self.ready = True
+
+    replica = HangingReplica(0, 1)
+    replica.synth_timeout = 0.5
+    replica.start()
+    yield replica
+    replica.stop()
+
+
+def test_hanging_replica_times_out(flextts, hanging_replica):
+    started = time.monotonic()
+    with pytest.raises(flextts.ReplicaError):
+        hanging_replica.synthesize("Never answered.", "en", "test.wav")
+    assert time.monotonic() - started < 5
+
+
+def test_hanging_replica_is_restarted_and_job_fails(flextts, hanging_replica):
+    speaker_wav = os.path.join(flextts.speaker_path, "en", "test.wav")
+    job = flextts.SynthesisJob("Never answered either.", "en", speaker_wav)
+    job.attempts = 2  # Retries used up
+    pid = hanging_replica.process.pid
+    flextts.InferenceScheduler._run_batch([job], hanging_replica)
+    assert isinstance(job.future.exception(timeout=5), flextts.ReplicaError)
+    assert hanging_replica.restarts == 1
+    assert hanging_replica.process.pid != pid
@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def gated(flextts, monkeypatch):
+    """Inference that holds the worker on the sentence "Gate." until released - returns (release event, inferred texts)"""
+    started, release = threading.Event(), threading.Event()
+    inferred = []
+    infer_sentence = flextts.infer_sentence
+
+    def gated_infer(text, *args, **kwargs):
+        inferred.append(text)
+        if text == "Gate.":
+            started.set()
+            release.wait(10)
+        return infer_sentence(text, *args, **kwargs)
+
+    monkeypatch.setattr(flextts, "infer_sentence", gated_infer)
+    speaker_wav = os.path.join(flextts.speaker_path, "en", "test.wav")
+    gate = flextts.InferenceScheduler.submit("Gate.", "en", speaker_wav)
+    assert started.wait(10)
+    yield release, inferred
+    release.set()
+    gate.result(10)
+
+
+def submit(flextts, text, **kwargs):
+    return flextts.InferenceScheduler.submit(text, "en", os.path.join(flextts.speaker_path, "en", "test.wav"), **kwargs)
+
+
+def test_identical_sentences_are_synthesized_once(flextts, gated):
+    release, inferred = gated
+    coalesced = flextts.InferenceScheduler.stats["coalesced"]
+    first, second = submit(flextts, "Said twice."), submit(flextts, "Said twice.")
+    release.set()
+    assert first.result(10) is second.result(10)
+    assert inferred.count("Said twice.") == 1
+    assert flextts.InferenceScheduler.stats["coalesced"] == coalesced + 1
+
+
+def test_full_queue_answers_503_with_retry_after(flextts, client, gated, monkeypatch):
+    release, _ = gated
+    monkeypatch.setattr(flextts.InferenceScheduler, "max_queue", 1)
+    waiting = submit(flextts, "Fills the queue.")
+    response = client.post("/", json={"text": "No room for me.", "response_type": "file"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    release.set()
+    waiting.result(10)
+
+
+def test_deadline_expires_while_queued(flextts, gated):
+    release, inferred = gated
+    expired = flextts.InferenceScheduler.stats["expired"]
+    late = submit(flextts, "Too late.", deadline=time.monotonic() + 0.05)
+    time.sleep(0.1)
+    release.set()
+    with pytest.raises(flextts.DeadlineExceededError):
+        late.result(10)
+    assert "Too late." not in inferred
+    assert flextts.InferenceScheduler.stats["expired"] == expired + 1
+
+
+def test_disconnect_cancels_queued_sentences(flextts, gated):
+    release, inferred = gated
+    stats = flextts.InferenceScheduler.stats
+    cancelled, jobs = stats["cancelled"], stats["jobs"]
+    speaker_wav = os.path.join(flextts.speaker_path, "en", "test.wav")
+    with pytest.raises(flextts.ClientDisconnectedError):
+        flextts.synthesize("Nobody listens any more.", "en", speaker_wav, disconnected=lambda: True)
+    after = submit(flextts, "Someone else.")
+    release.set()
+    after.result(10)
+    deadline = time.monotonic() + 10
+    while stats["jobs"] < jobs + 2 and time.monotonic() < deadline:
+        time.sleep(0.01)  # The batch is counted right after its results are handed out
+    assert "Nobody listens any more." not in inferred
+    assert stats["cancelled"] == cancelled + 1
+    # The gate and the sentence after it ran, the cancelled one does not count as a job
+    assert stats["jobs"] == jobs + 2
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+# One sentence without commas, long enough to be split into several segments at spaces
+LONG_SENTENCE = " ".join(["word"] * 150) + "."
+
+
+@pytest.mark.parametrize("crossfade_samples", [0, 480, 10 ** 6])
+def test_split_sentence_with_any_crossfade(flextts, monkeypatch, crossfade_samples):
+    monkeypatch.setattr(flextts, "SEGMENT_CROSSFADE_SAMPLES", crossfade_samples)
+    segments = flextts.split_segments(LONG_SENTENCE, "en")
+    assert len(segments) > 1
+    speaker_wav = os.path.join(flextts.speaker_path, "en", "test.wav")
+    segment_samples = [len(flextts.synthesize(text, "en", speaker_wav)) - flextts.SENTENCE_PAUSE_SAMPLES for text, _ in segments]
+
+    wav = flextts.synthesize(LONG_SENTENCE, "en", speaker_wav)
+
+    # Consecutive segments overlap by the crossfade, at most by the shorter of the two
+    overlaps = sum(min(crossfade_samples, left, right) for left, right in zip(segment_samples, segment_samples[1:]))
+    assert len(wav) == sum(segment_samples) - overlaps + flextts.SENTENCE_PAUSE_SAMPLES
+
+
+def test_split_sentence_without_crossfade_over_http(flextts, client, monkeypatch):
+    monkeypatch.setattr(flextts, "SEGMENT_CROSSFADE_SAMPLES", 0)
+    response = client.post("/", json={"text": LONG_SENTENCE, "response_type": "file"})
+    assert response.status_code == 200
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+def import_flextts(**environ) -> subprocess.CompletedProcess:
+    """Import flextts with the test environment plus the given variables in a fresh interpreter"""
+    tests = os.path.dirname(os.path.abspath(__file__))
+    code = f"import sys; sys.path.insert(0, {tests!r}); import conftest"
+    return subprocess.run([sys.executable, "-c", code], env={**os.environ, **environ}, capture_output=True, text=True, timeout=120)
+
+
+@pytest.mark.parametrize("environ", [{"DEFAULT_PRIORITY": "urgent"}, {"PRIORITY_WEIGHTS": "interactive=8,urgent=2"}, {"PRIORITY_WEIGHTS": "background=0"}])
+def test_invalid_priority_settings_fail_at_startup(flextts, environ):
+    result = import_flextts(**environ)
+    assert result.returncode != 0
+    assert "Fatal Error: " + next(iter(environ)) in result.stderr
+
+
+@pytest.mark.parametrize("environ", [{"AUTOTUNE": "yes"}, {"AUTOTUNE_GOAL": "speed"}])
+def test_invalid_autotune_settings_fail_at_startup(flextts, environ):
+    result = import_flextts(**environ)
+    assert result.returncode != 0
+    assert "Fatal Error: AUTOTUNE" in result.stderr
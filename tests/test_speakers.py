@@ -0,0 +1,20 @@
+import os
+import shutil
+
+
+def test_etag_changes_when_a_speaker_is_added(flextts, client):
+    response = client.get("/speakers")
+    etag = response.headers["ETag"]
+    assert client.get("/speakers", headers={"If-None-Match": etag}).status_code == 304
+
+    added = os.path.join(flextts.speaker_path, "en", "new_voice.wav")
+    shutil.copy(os.path.join(flextts.speaker_path, "en", "test.wav"), added)
+    try:
+        flextts.SpeakerIndex.refresh()
+        response = client.get("/speakers", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert "New Voice" in response.get_json()["en"]
+    finally:
+        os.remove(added)
+        flextts.SpeakerIndex.refresh(force=True)
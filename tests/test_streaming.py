@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+
+
+def pcm_peak(data: bytes) -> int:
+    return int(np.max(np.abs(np.frombuffer(data, dtype="<i2").astype(np.int32))))
+
+
+def test_stream_is_as_loud_as_file(flextts):
+    text = "The first sentence is streamed. The second one follows right after."
+    speaker_wav = os.path.join(flextts.speaker_path, "en", "test.wav")
+    streamed = b"".join(flextts.stream_speech(text, "en", speaker_wav, "pcm"))
+    encoded, _ = flextts.AudioEncoder.encode(flextts.synthesize(text, "en", speaker_wav), flextts.TTSManager.sample_rate, "pcm")
+    assert abs(pcm_peak(streamed) - pcm_peak(encoded)) <= 1
+
+
+def test_postprocessing_error_ends_stream_with_log_line(flextts, monkeypatch):
+    logged = []
+    monkeypatch.setattr(flextts, "log", lambda *args: logged.append(" ".join(str(arg) for arg in args)))
+
+    def broken(self, wavs, sample_rate):
+        yield next(iter(wavs))
+        raise RuntimeError("broken chunk")
+
+    monkeypatch.setattr(flextts.PostProcessing, "stream", broken)
+    speaker_wav = os.path.join(flextts.speaker_path, "en", "test.wav")
+    streamed = b"".join(flextts.stream_speech("One sentence. Another sentence.", "en", speaker_wav, "pcm"))
+    assert len(streamed) > 0
+    assert logged == ["ERROR while streaming: broken chunk"]
+
+
+@pytest.mark.parametrize("samples", [1, 100, 255, 256, 4000])
+def test_speed_change_of_short_chunks(flextts, samples):
+    if flextts.torchaudio_functional is None:
+        pytest.skip("torchaudio is not installed")
+    options = flextts.PostProcessing(speed=1.5)
+    wav = np.sin(np.arange(samples, dtype=np.float32) / 10) * 0.5
+    assert len(options._change_speed(wav, 24000)) == int(samples / 1.5)
@@ -0,0 +1,33 @@
+import io
+import os
+
+TEXT = "Dr. Smith is here. The second sentence follows! And a third one?"
+
+
+def read_segments(flextts, text):
+    feed = flextts.SegmentFeed("en")
+    flextts.read_text_stream(io.BytesIO(text.encode()), feed)
+    segments = []
+    while (segment := feed.take()) is not None:
+        segments.append(segment)
+    assert feed.finished
+    return segments
+
+
+def test_streamed_text_splits_at_sentences(flextts):
+    assert read_segments(flextts, TEXT) == [("Dr. Smith is here.", True), ("The second sentence follows!", True), ("And a third one?", True)]
+
+
+def test_streamed_text_without_punctuation_is_not_held_back(flextts):
+    words = ["word"] * 150
+    segments = read_segments(flextts, " ".join(words))
+    assert len(segments) > 1
+    assert all(len(segment) <= flextts.SEGMENT_MAX_CHARS for segment, _ in segments)
+    assert " ".join(segment for segment, _ in segments).split() == words
+
+
+def test_streamed_text_gives_the_same_audio_length(flextts, client):
+    response = client.post("/stream", data=TEXT.encode())
+    assert response.status_code == 200
+    speaker_wav = os.path.join(flextts.speaker_path, "en", "test.wav")
+    assert len(response.get_data()) // 2 == len(flextts.synthesize(TEXT, "en", speaker_wav))